@@ -1,73 +1,12 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import Input, Output, html, callback, dcc, State
+from dash import Input, Output, html, clientside_callback, dcc, ClientsideFunction
 
-dash.register_page(__name__, path='/config_database')
-
-
-
-# Define styles for the sidebar and content area
-SIDEBAR_STYLE = {
-    "position": "fixed",
-    "top": 0,
-    "left": 0,
-    "bottom": 0,
-    "width": "16rem",
-    "padding": "2rem 1rem",
-    "background-color": "#343a40",  # Darker background
-    "color": "#ffffff",  # White text
-    "transition": "all 0.3s",
-}
-
-CONTENT_STYLE = {
-    "margin-left": "18rem",
-    "margin-right": "2rem",
-    "padding": "2rem 1rem",
-}
-
-# Function to create the sidebar menu
-def create_sidebar():
-    offcanvas = dbc.Offcanvas(
-        [
-            html.Div([
-                dbc.NavItem(dbc.NavLink(
-                    [html.I(className="bi bi-caret-right-fill me-2"), "Database Settings"],
-                    href="/config_database"
-                )),
-                dbc.NavItem(dbc.NavLink(
-                    [html.I(className="bi bi-gear-fill me-2"), "Testplace Configuration"],
-                    href="/config_tp"
-                )),
-                dbc.NavItem(dbc.NavLink(
-                    [html.I(className="bi bi-pencil-square me-2"), "Edit Testplace"],
-                    href="/impl"
-                )),
-            ]),
-        ],
-        id="offcanvas",
-        title="Testing Menu",
-        is_open=False,
-    )
+from UltraTorkWebChrome import CONTENT_STYLE, create_sidebar, icons_stylesheet
+from UltraTorkWebMetrics import timed
 
-    sidebar = html.Div(
-        [
-            html.Img(src="/static/images/ultratronikLogoU.png", height="60px", style={"margin-bottom": "20px"}),
-            dbc.NavbarBrand("UltraTorkWeb", className="ms-2", style={"font-size": "21px", "font-weight": "bold"}),
-            dbc.Nav(
-                [
-                    dbc.NavLink("Dashboard", href="/", className="bi bi-house"),
-                    dbc.NavLink("Testing Menu", href="/", id="open-offcanvas", className="bi bi-geo-alt", active=True),
-                    dbc.NavLink("Documentation", href="/documentation", className="bi bi-pen"),
-                ],
-                vertical=True,
-                pills=True,
-            ),
-            offcanvas,
-        ],
-        style=SIDEBAR_STYLE,
-    )
+dash.register_page(__name__, path='/config_database')
 
-    return sidebar
 
 def MainPage():
     DatabaseTyp = "SqlLite"
@@ -137,27 +76,21 @@ def MainPage():
                      html.Div(id='save-button-container', children=save_button, style={'display': 'none'})])
 
 
-@callback(
+# Show the inputs of the selected database type; runs in the browser (assets/UltraTorkWebClientside.js)
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="toggle_params"),
     [Output('sqlite', 'style'),
      Output('mysql-params', 'style'),
      Output('save-button-container', 'style')],
     [Input('inputDatabaseTyp', 'value')]
 )
-def toggle_params(database_typ):
-    if database_typ == 'SqlLite':
-        return {'display': 'block'}, {'display': 'none'}, {'display': 'block'}
-    elif database_typ == 'MySQL':
-        return {'display': 'none'}, {'display': 'block'}, {'display': 'block'}
-    else:
-        return {'display': 'none'}, {'display': 'none'}, {'display': 'none'}
 
 
 def ConfigDatabasePage():
 
     layout = html.Div(
         [
-            html.Link(href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.9.0/font/bootstrap-icons.css",
-                      rel="stylesheet"),
+            icons_stylesheet(),
             dcc.Location(id='url', refresh=False),
             html.Div(id="sidebar", children=create_sidebar()),
             html.Div(id="page-content", style=CONTENT_STYLE, children=[
@@ -172,5 +105,7 @@ def ConfigDatabasePage():
     )
     return layout
 
-layout = ConfigDatabasePage()
+@timed("layout")
+def layout(**kwargs):
+    return ConfigDatabasePage()
 
@@ -1,91 +1,47 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import Input, Output, html, callback, dcc, State
-import json
+from dash import Input, Output, html, callback, clientside_callback, dcc, State, ClientsideFunction
+import threading
 
 from UltraTorkWebGuiIf import UltraTorkWebGuiIf
-
-import os
+from UltraTorkWebConfigStore import UltraTorkWebConfigStore
+from UltraTorkWebChrome import SIDEBAR_STYLE, cached_fragment, create_sidebar, icons_stylesheet
+from UltraTorkWebMetrics import timed
 
 GuiDataClass = UltraTorkWebGuiIf()
+ConfigStore = UltraTorkWebConfigStore()
+ConfigLock = threading.Lock()
 
 dash.register_page(__name__, path='/config_tp')
 
 
-SIDEBAR_STYLE = {
-    "position": "fixed",
-    "top": 0,
-    "left": 0,
-    "bottom": 0,
-    "width": "16rem",
-    "padding": "2rem 1rem",
-    "background-color": "#343a40",  # Darker background
-    "color": "#ffffff",  # White text
-    "transition": "all 0.3s",
-}
-
-CONTENT_STYLE = {
-    "margin-left": "18rem",
-    "margin-right": "2rem",
-    "padding": "2rem 1rem",
-}
-
-def SidebarMenu():
-    offcanvas = dbc.Offcanvas(
-        [
-            html.Div([
-                dbc.NavItem(dbc.NavLink(
-                    [
-                        html.I(className="bi bi-caret-right-fill me-2 "),
-                        "Database Settings"
-                    ],
-                    href="/config_database"
-                )),
-                dbc.NavItem(dbc.NavLink(
-                    [
-                        html.I(className="bi bi-gear-fill me-2"),
-                        "Testplace Configuration"
-                    ],
-                    href="/config_tp"
-                )),
-                dbc.NavItem(dbc.NavLink(
-                    [
-                        html.I(className="bi bi-pencil-square me-2"),
-                        "Edit Testplace"
-                    ],
-                    href="/impl"
-                )),
-            ]),
-        ],
-        id="offcanvas",
-        title="Testing Menu",
-        is_open=False,
-    )
-
-    sidebar = html.Div(
+# Inputs of the "TP Input" tab and the getTpConfigData() keys they show
+CONFIG_FIELDS = [
+    ('inputTP', 'TpName'),
+    ('inputAppendix', 'Appendix'),
+    ('inputTestdata', 'TestData'),
+    ('inputTpPath', 'Path'),
+    ('inputDbPath', 'DBPath'),
+    ('inputConfig', 'Config'),
+    ('inputOutput', 'Outputfile'),
+    ('inputDataPath', 'DataPath'),
+    ('inputWorkspace', 'Workspace'),
+    ('inputXMLOutput', 'XmlOutputPath'),
+]
+
+def SidebarBrand():
+    return dbc.Row(
         [
-            html.Img(src="/static/images/ultratronikLogoU.png", height="60px", style={"margin-bottom": "20px"}),
-            dbc.NavbarBrand("UltraTorkWeb", className="ms-2", style={"font-size": "21px", "font-weight": "bold"}),
-            dbc.Nav(
-                [
-                    dbc.NavLink("Dashboard", href="/", className="bi bi-house"),
-                    dbc.NavLink("Testing Menu", href="/", id="open-offcanvas", className="bi bi-geo-alt", active=True),
-                    dbc.NavLink("Documentation", href="/documentation", className="bi bi-pen"),
-                ],
-                vertical=True,
-                pills=True,
-            ),
-            offcanvas,
+            dbc.Col(html.Img(src="/static/images/ultratronikLogoU.png", height="30px"), width="auto"),
+            dbc.Col(dbc.NavbarBrand("UltraTorkWeb", className="ms-2")),
+            dbc.Col(html.Hr(), width="100%"),  # Horizontal line
         ],
-        style=SIDEBAR_STYLE,
+        align="center",
+        className="g-0"
     )
 
-    return sidebar
-
 def MenuConfigTp():
-    TpList = GuiDataClass.getTpNameList()
-    SelectedTp = GuiDataClass.getSelectedTpNameConfigPage()
-
+    # The testplace list and selection are loaded by the callbacks once the page is shown
     # Add an extra input field for Test Case Name (TCName) in MenuConfigTp function
     modal = html.Div(
         [
@@ -97,8 +53,8 @@ def MenuConfigTp():
                     html.Div([
                         dbc.Label("Testcases", width="auto", size="sm"),
                         dcc.Dropdown(
-                            value=SelectedTp,
-                            options=[{"label": i, "value": i} for i in TpList],
+                            value=None,
+                            options=[],
                             id="SelectedTpConfig"
                         ),
                     ]),
@@ -132,34 +88,27 @@ def MenuConfigTp():
         ],
     )
 
-    @callback(
-        Output("modal-centered", "is_open"),
-        Output("inputTC", "value"),
-        Output("SelectedTpConfig", "options"),
-        [Input("open-centered", "n_clicks"), Input("close-centered", "n_clicks"),
-         Input("open-new-tp", "n_clicks")],
-        [State("modal-centered", "is_open"), State("SelectedTpConfig", "options"), State("inputTC", "value")],
-    )
-
+    return modal
 
-    def toggle_modal(n1, n2, n3, is_open, options, tc_value):
-        changed_id = [p['prop_id'] for p in dash.callback_context.triggered][0]
-        if 'open-new-tp' in changed_id:
-            # Clear input fields only for the new testcase, set modal to open, and add new option to dropdown menu
-            new_option = {"label": tc_value or "New Testcase", "value": tc_value or "New Testcase"}
-            new_options = options + [new_option]
-            return True, tc_value, new_options
-        elif n1 or n2:
-            return not is_open, '', options
-        return is_open, '', options
 
-    return modal
+# Open and close the modal, add a new testcase to the dropdown and fill the dropdown with the
+# testplaces from load_tp_names(); runs in the browser (assets/UltraTorkWebClientside.js)
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="toggle_config_modal"),
+    Output("modal-centered", "is_open"),
+    Output("inputTC", "value"),
+    Output("SelectedTpConfig", "options"),
+    Output("SelectedTpConfig", "value"),
+    [Input("open-centered", "n_clicks"), Input("close-centered", "n_clicks"),
+     Input("open-new-tp", "n_clicks"), Input("config-tp-names", "data")],
+    [State("modal-centered", "is_open"), State("SelectedTpConfig", "options"), State("inputTC", "value")],
+)
 
 
 def MainPage() -> html:
 
-    newTpData = GuiDataClass.getTpConfigData()
-
+    # The fields are filled by render_page_content() for the selected testplace
+    newTpData = dict.fromkeys(key for _, key in CONFIG_FIELDS)
 
 
     inputTP = dbc.Row([
@@ -353,21 +302,14 @@ def MainPage() -> html:
 def ConfigTpPage():
     layout = html.Div([
         # Include Bootstrap Icons CDN link
-        html.Link(href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.9.0/font/bootstrap-icons.css",
-                  rel="stylesheet"),
+        icons_stylesheet(),
+        dcc.Location(id='config-tp-url', refresh=False),
+        dcc.Store(id='config-tp-names'),
 
         # Sidebar
         html.Div(id="sidebar", style=SIDEBAR_STYLE, children=[
-            dbc.Row(
-                [
-                    dbc.Col(html.Img(src="/static/images/ultratronikLogoU.png", height="30px"), width="auto"),
-                    dbc.Col(dbc.NavbarBrand("UltraTorkWeb", className="ms-2")),
-                    dbc.Col(html.Hr(), width="100%"),  # Horizontal line
-                ],
-                align="center",
-                className="g-0"
-            ),
-            SidebarMenu()  # Include Sidebar content
+            cached_fragment("config-tp-brand", SidebarBrand),
+            create_sidebar()  # Include Sidebar content
         ]),
 
     ])
@@ -395,19 +337,33 @@ def ConfigTpPage():
     return grid
 
 
-layout = html.Div(ConfigTpPage(), id="TpConfigSettings")
+# Dash builds the layout per request, so importing the page does not touch the testplace data
+@timed("layout")
+def layout(**kwargs):
+    return html.Div(ConfigTpPage(), id="TpConfigSettings")
 
 
 @callback(
-    [Output('TpConfigSettings', 'children'),
-     Output('SelectedTpConfig', 'value')],  # Add Output for resetting dropdown
+    Output('config-tp-names', 'data'),
+    Input('config-tp-url', 'pathname')
+)
+def load_tp_names(pathname):
+    return {"names": GuiDataClass.getTpNameList(), "selected": GuiDataClass.getSelectedTpNameConfigPage()}
+
+
+@callback(
+    [Output(input_id, 'value') for input_id, _ in CONFIG_FIELDS],
     Input('SelectedTpConfig', 'value')
 )
 def render_page_content(TpName):
+    # The selection and the read of its data go through shared state of the interface class;
+    # without a selection the data of the current one is shown
+    with ConfigLock:
+        if TpName:
+            GuiDataClass.setSelectedTpNameConfigPage(TpName)
+        newTpData = GuiDataClass.getTpConfigData()
 
-    GuiDataClass.setSelectedTpNameConfigPage(TpName)
-
-    return ConfigTpPage(), None
+    return [newTpData[key] for _, key in CONFIG_FIELDS]
 
 @callback(
     Output('div-button', 'children'),
@@ -441,22 +397,20 @@ def write_tp_name_value(n, TpName, Appendix, Testdata, TpPath, DbPath, Config, O
             "XMLOutput": XMLOutput
         }
 
-        # Load existing test cases from JSON file or create an empty dictionary if the file doesn't exist or is empty
-        try:
-            with open('UltraTorkWebConfig.json', 'r') as json_file:
-                testcases = json.load(json_file)
-        except (FileNotFoundError, json.JSONDecodeError):
-            testcases = {}
-
-        # Check if the test case already exists
-        if TpName not in testcases:
-            # Add the new test case with the specified name
+        # Add the new test case unless it already exists; the store re-checks and writes under its lock
+        def add_testcase(testcases):
+            if TpName in testcases:
+                return False
             testcases[TCName] = testcase_data
+            return True
 
-            # Save updated test cases to JSON file
-            with open('UltraTorkWebConfig.json', 'w') as json_file:
-                json.dump(testcases, json_file, indent=4)
+        try:
+            added = ConfigStore.update(add_testcase)
+        except ValueError as e:
+            # A broken hand edit of the file is left alone instead of being overwritten
+            return [html.Div("UltraTorkWebConfig could not be read, fix it first: {}".format(e))]
 
+        if added:
             # Provide feedback to the user
             return [html.Div("New test case '{}' added and saved to UltraTorkWebConfig".format(TCName))]
         else:
@@ -1,86 +1,63 @@
+import re
+
 import dash
 import dash_bootstrap_components as dbc
-from dash import dcc, html, Input, Output, State, callback, ALL
+from dash import dcc, html, dash_table, Input, Output, State, callback, clientside_callback, ClientsideFunction
 from UltraTorkWebGuiIf import UltraTorkWebGuiIf
-from datetime import date, datetime
+from UltraTorkWebResultDb import UltraTorkWebResultDb
+from UltraTorkWebChrome import CONTENT_STYLE, SIDEBAR_STYLE, create_sidebar, icons_stylesheet
+from UltraTorkWebMetrics import timed
+from datetime import date
 
 # Initialize the GUI data interface
 GuiDataClass = UltraTorkWebGuiIf()
+ResultDbClass = UltraTorkWebResultDb()
 
 # Register the page for Dash
 dash.register_page(__name__, path='/impl')
 
-# Define styles for the sidebar and content area
-SIDEBAR_STYLE = {
-    "position": "fixed",
-    "top": 0,
-    "left": 0,
-    "bottom": 0,
-    "width": "16rem",
-    "padding": "2rem 1rem",
-    "background-color": "#343a40",  # Darker background
-    "color": "#ffffff",  # White text
-    "transition": "all 0.3s",
-}
-
-CONTENT_STYLE = {
-    "margin-left": "18rem",
-    "margin-right": "2rem",
-    "padding": "2rem 1rem",
-}
-
-# Function to create the sidebar menu
-def create_sidebar():
-    offcanvas = dbc.Offcanvas(
-        [
-            html.Div([
-                dbc.NavItem(dbc.NavLink(
-                    [html.I(className="bi bi-caret-right-fill me-2"), "Database Settings"],
-                    href="/config_database"
-                )),
-                dbc.NavItem(dbc.NavLink(
-                    [html.I(className="bi bi-gear-fill me-2"), "Testplace Configuration"],
-                    href="/config_tp"
-                )),
-                dbc.NavItem(dbc.NavLink(
-                    [html.I(className="bi bi-pencil-square me-2"), "Edit Testplace"],
-                    href="/impl"
-                )),
-            ]),
-        ],
-        id="offcanvas",
-        title="Testing Menu",
-        is_open=False,
-    )
-
-    sidebar = html.Div(
-        [
-            html.Img(src="/static/images/ultratronikLogoU.png", height="60px", style={"margin-bottom": "20px"}),
-            dbc.NavbarBrand("UltraTorkWeb", className="ms-2", style={"font-size": "21px", "font-weight": "bold"}),
-            dbc.Nav(
-                [
-                    dbc.NavLink("Dashboard", href="/", className="bi bi-house"),
-                    dbc.NavLink("Testing Menu", href="/", id="open-offcanvas", className="bi bi-geo-alt", active=True),
-                    dbc.NavLink("Documentation", href="/documentation", className="bi bi-pen"),
-                ],
-                vertical=True,
-                pills=True,
-            ),
-            offcanvas,
-        ],
-        style=SIDEBAR_STYLE,
-    )
 
-    return sidebar
+# Result tables: rows per page, columns of both tabs and the result database fields they sort and filter on
+RESULT_TABLE_PAGE_SIZE = 50
+
+RESULT_TABLE_LIST_COLUMNS = [("Nr.", 'nr'), ("Name", 'name'), ("SW Version", 'sw'), ("Runtime", 'runtime'),
+                             ("Try", 'try'), ("Result", 'result')]
+RESULT_TABLE_TIME_COLUMNS = [("Nr.", 'nr'), ("Name", 'name'), ("Start", 'start'), ("End", 'end'),
+                             ("Runtime", 'runtime'), ("Try", 'try'), ("Result", 'result')]
+
+RESULT_TABLE_FIELDS = {'name': 'TcName', 'sw': 'SwVersion', 'start': 'Start', 'end': 'End',
+                       'runtime': 'Runtime', 'try': 'Try', 'result': 'Result'}
+RESULT_TABLE_TYPES = {'nr': 'numeric', 'runtime': 'numeric', 'try': 'numeric'}
+
+# 'nr' is the row number on the page and has no database field; its sort button and filter are hidden,
+# as DataTable cannot switch sorting and filtering off per column
+RESULT_TABLE_CSS = [{'selector': 'th[data-dash-column="{}"] .column-header--sort, '
+                                 'th.dash-filter[data-dash-column="{}"] input'.format(column_id, column_id),
+                     'rule': 'display: none'}
+                    for column_id in dict.fromkeys(column_id for _, column_id in
+                                                   RESULT_TABLE_LIST_COLUMNS + RESULT_TABLE_TIME_COLUMNS)
+                    if column_id not in RESULT_TABLE_FIELDS]
+
+# DataTable filter operators and the backend operators they map to
+FILTER_OPERATOR_MAP = {'=': '=', 'eq': '=', '!=': '!=', 'ne': '!=', '<': '<', 'lt': '<', '<=': '<=', 'le': '<=',
+                       '>': '>', 'gt': '>', '>=': '>=', 'ge': '>=', 'contains': 'contains',
+                       'datestartswith': 'startswith'}
+
+RESULT_TABLE_STYLES = [
+    {'if': {'filter_query': '{result} = "PASS"', 'column_id': 'result'},
+     'backgroundColor': '#73a839', 'color': 'white'},
+    {'if': {'filter_query': '{result} = "FAIL"', 'column_id': 'result'},
+     'backgroundColor': '#c71c22', 'color': 'white'},
+    {'if': {'filter_query': '{result} != "PASS" && {result} != "FAIL"', 'column_id': 'result'},
+     'backgroundColor': '#dd5600', 'color': 'white'},
+]
 
 # Function to create the filter modal
 def create_filter_modal():
-    tp_list = GuiDataClass.getTpNameList()
-    selected_tp = GuiDataClass.getTpSelectedTp()
-
+    # Testplace list and selection are loaded by load_tp_names() once the page is shown
     tp_dropdown = dcc.Dropdown(
-        value=selected_tp,
-        options=[{"label": i, "value": i} for i in tp_list],
+        value=None,
+        options=[],
         id="inlineFormTpName",
     )
 
@@ -127,106 +104,59 @@ def create_filter_modal():
         ],
     )
 
-    @callback(
-        Output("modal", "is_open"),
-        [Input("open-centered", "n_clicks"), Input("close-centered", "n_clicks")],
-        [State("modal", "is_open")],
-    )
-    def toggle_modal(open_clicks, close_clicks, is_open):
-        if open_clicks or close_clicks:
-            return not is_open
-        return is_open
-
     return modal
 
-# Function to create the content for the main page
-def create_main_page_content(ResultTcList):
-    # Initialize counts
-    pass_count = 0
-    fail_count = 0
-    other_count = 0
-
-    table1_row = []
-    table2_row = []
-
-    for ResultTc in ResultTcList:
-        for i, result in enumerate(ResultTc[1]):
-            result_type = result[7]
-            if result_type == "PASS":
-                pass_count += 1
-            elif result_type == "FAIL":
-                fail_count += 1
-            else:
-                other_count += 1
-
-            button_color = 'success' if result_type == "PASS" else 'danger' if result_type == "FAIL" else 'warning'
-            button_label = result_type
-
-            row1 = html.Tr([
-                html.Td(str(i)),
-                html.Td(result[2]),
-                html.Td(result[3]),
-                html.Td(result[6]),
-                html.Td(result[8]),
-                dbc.Button(button_label, color=button_color, size="sm", id={'type': 'result-button', 'index': i})
-            ])
-            table1_row.append(row1)
-
-            row2 = html.Tr([
-                html.Td(str(i)),
-                html.Td(result[2]),
-                html.Td(result[4]),
-                html.Td(result[5]),
-                html.Td(result[6]),
-                html.Td(result[8]),
-                dbc.Button(button_label, color=button_color, size="sm", id={'type': 'result-button', 'index': i})
-            ])
-            table2_row.append(row2)
+# Callback to open and close the filter modal; runs in the browser (assets/UltraTorkWebClientside.js)
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="toggle_filter_modal"),
+    Output("modal", "is_open"),
+    [Input("open-centered", "n_clicks"), Input("close-centered", "n_clicks")],
+    [State("modal", "is_open")],
+)
 
-    status_bar = dbc.Alert(
-        f"Total: {pass_count + fail_count + other_count} | Pass: {pass_count} | Fail: {fail_count} | Other: {other_count}",
-        color="info"
+# Function to create a result table that fetches only its visible page from the backend
+def create_result_table(table_id, table_columns):
+    return dash_table.DataTable(
+        id=table_id,
+        columns=[{'name': name, 'id': column_id, 'type': RESULT_TABLE_TYPES.get(column_id, 'text')}
+                 for name, column_id in table_columns],
+        data=[],
+        page_action='custom',
+        page_current=0,
+        page_size=RESULT_TABLE_PAGE_SIZE,
+        page_count=0,
+        sort_action='custom',
+        sort_mode='single',
+        sort_by=[],
+        filter_action='custom',
+        filter_query='',
+        style_cell={'textAlign': 'left'},
+        style_data_conditional=RESULT_TABLE_STYLES,
+        css=RESULT_TABLE_CSS,
     )
 
-    table1_header = [
-        html.Thead(html.Tr([
-            html.Th("Nr.", style={'width': '2%'}),
-            html.Th("Name", style={'width': '60%'}),
-            html.Th("SW Version", style={'width': '10%'}),
-            html.Th("Runtime", style={'width': '10%'}),
-            html.Th("Try", style={'width': '8%'}),
-            html.Th("Result", style={'width': '10%'}),
-        ]))
-    ]
+# Function to create the text of the status bar from the per-result counts
+def create_status_text(counts):
+    pass_count = counts.get("PASS", 0)
+    fail_count = counts.get("FAIL", 0)
+    other_count = sum(counts.values()) - pass_count - fail_count
 
-    tab1_layout = dbc.Table(table1_header + [html.Tbody(table1_row)], striped=True, bordered=True, hover=True)
+    return f"Total: {pass_count + fail_count + other_count} | Pass: {pass_count} | Fail: {fail_count} | Other: {other_count}"
 
+# Function to create the content for the main page; the callbacks below fill in counts and rows
+def create_main_page_content():
     tab1_content = dbc.Card(
         dbc.CardBody([
-            status_bar,
-            tab1_layout
+            dbc.Alert(create_status_text({}), color="info", id='status-bar-list'),
+            create_result_table('result-table-list', RESULT_TABLE_LIST_COLUMNS)
         ]),
         className="mt-3",
     )
 
-    table2_header = [
-        html.Thead(html.Tr([
-            html.Th("Nr.", style={'width': '2%'}),
-            html.Th("Name", style={'width': '50%'}),
-            html.Th("Start", style={'width': '10%'}),
-            html.Th("End", style={'width': '10%'}),
-            html.Th("Runtime", style={'width': '7%'}),
-            html.Th("Try", style={'width': '7%'}),
-            html.Th("Result", style={'width': '4%'}),
-        ]))
-    ]
-
-    tab2_layout = dbc.Table(table2_header + [html.Tbody(table2_row)], striped=True, bordered=True, hover=True)
-
     tab2_content = dbc.Card(
         dbc.CardBody([
-            status_bar,
-            tab2_layout
+            dbc.Alert(create_status_text({}), color="info", id='status-bar-time'),
+            create_result_table('result-table-time', RESULT_TABLE_TIME_COLUMNS)
         ]),
         className="mt-3",
     )
@@ -240,29 +170,46 @@ def create_main_page_content(ResultTcList):
         html.Div(id='detailed-info'), label="Detailed Info", tab_id="tab-detailed-info"
     )
 
+    # Key of the last activated result row of either table
+    activated_result = dcc.Store(id='activated-result')
+
+    # Counts behind the status bars with their filter, and the last result id that changed the tables
+    status_counts = dcc.Store(id='impl-status-counts')
+    results_changed = dcc.Store(id='impl-results-changed')
+    # Set when a result stream event does not continue the counts; they are then read again
+    status_stale = dcc.Store(id='impl-status-stale')
+    # The status bars follow the result stream for as long as the page is shown
+    result_stream = dcc.Store(id='impl-result-stream', data=True)
+
     main_tabs = dbc.Tabs([
         dbc.Tab(tabs, label="Tables", tab_id="tab-tables"),
         detailed_info_tab
     ], id="main-tabs", active_tab="tab-tables")
 
     layout = dbc.Form([
-        main_tabs
+        main_tabs,
+        activated_result,
+        status_counts,
+        results_changed,
+        status_stale,
+        result_stream
     ])
 
     return dbc.CardBody(layout)
 
 # Function to create the base layout of the page
-def create_impl_base_page(ResultTcList):
+def create_impl_base_page():
     layout = html.Div(
         [
-            html.Link(href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.9.0/font/bootstrap-icons.css", rel="stylesheet"),
+            icons_stylesheet(),
+            dcc.Location(id='impl-url', refresh=False),
             html.Div(id="sidebar", style=SIDEBAR_STYLE, children=create_sidebar()),
             html.Div(id="page-content", style=CONTENT_STYLE, children=[
                 dbc.Card(
                     [
                         dbc.CardHeader(html.H2("Edit Testplace")),
                         dbc.CardBody(create_filter_modal()),
-                        dbc.CardBody(create_main_page_content(ResultTcList))
+                        dbc.CardBody(create_main_page_content())
                     ]
                 )
             ])
@@ -270,69 +217,175 @@ def create_impl_base_page(ResultTcList):
     )
     return layout
 
-# Define the layout for the page
-layout = html.Div(create_impl_base_page([]), id="TcImplementationListChanged")
+# Define the layout for the page; Dash builds it per request, the callbacks only update the parts that change
+@timed("layout")
+def layout(**kwargs):
+    return html.Div(create_impl_base_page(), id="TcImplementationListChanged")
+
+# Callback to load the testplace list and selection into the filter modal
+@callback(
+    [Output('inlineFormTpName', 'options'), Output('inlineFormTpName', 'value')],
+    [Input('impl-url', 'pathname')]
+)
+def load_tp_names(pathname):
+    return [{"label": i, "value": i} for i in GuiDataClass.getTpNameList()], GuiDataClass.getTpSelectedTp()
+
+# Inputs of the filter modal
+RESULT_FILTER_INPUTS = [Input('inlineFormTpName', 'value'), Input('result-filter', 'value'),
+                        Input('date-picker-range', 'start_date'), Input('date-picker-range', 'end_date')]
+RESULT_FILTER_IDS = ('inlineFormTpName', 'result-filter', 'date-picker-range')
 
-# Callback to update the page content based on the selected test place and result filter
+# Callback to update the status bar counts based on the selected test place and result filter
 @callback(
-    Output('TcImplementationListChanged', 'children'),
-    [Input('inlineFormTpName', 'value'), Input('result-filter', 'value'),
-     Input('date-picker-range', 'start_date'), Input('date-picker-range', 'end_date')]
+    [Output('status-bar-list', 'children'), Output('status-bar-time', 'children'),
+     Output('impl-status-counts', 'data')],
+    RESULT_FILTER_INPUTS + [Input('impl-status-stale', 'data')]
+)
+def update_page_content(tp_name, result_filter, start_date, end_date, stale=None):
+    # Only the per-result counts of the matching runs are read; the tables fetch their own page
+    start_date, end_date, result_types = get_result_filter(result_filter, start_date, end_date)
+    # The id of the last counted result comes from the same read, result stream events up to it are ignored
+    counts, last_id = ResultDbClass.countResultsWithId([tp_name] if tp_name else [], start_date, end_date,
+                                                       result_types)
+
+    status_text = create_status_text(counts)
+    status_counts = {"tp": tp_name, "counts": counts, "types": result_types, "start": start_date, "end": end_date,
+                     "lastId": last_id}
+    return status_text, status_text, status_counts
+
+# Callback to open the result stream when the page is shown; runs in the browser
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="set_result_stream"),
+    Output('result-stream', 'data', allow_duplicate=True),
+    Input('impl-result-stream', 'data'),
+    prevent_initial_call='initial_duplicate'
+)
+
+# Callback to add new results of the result stream (UltraTorkWebResultStream.py) to the status bars;
+# runs in the browser and only makes the tables fetch their page when the shown testplace got results.
+# Events that overlap the counted results or follow a missed event make update_page_content() count again
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="apply_impl_result_event"),
+    [Output('status-bar-list', 'children', allow_duplicate=True),
+     Output('status-bar-time', 'children', allow_duplicate=True),
+     Output('impl-status-counts', 'data', allow_duplicate=True),
+     Output('impl-results-changed', 'data'),
+     Output('impl-status-stale', 'data')],
+    [Input('result-event', 'data')],
+    [State('impl-status-counts', 'data')],
+    prevent_initial_call=True
 )
-def update_page_content(tp_name, result_filter, start_date, end_date):
-    GuiDataClass.setResultDataFilterTpName(tp_name)
-    ResultTcList = GuiDataClass.getTcResultList()
 
+# Function to translate the filter modal values into (start date, end date, result types) for the backend
+def get_result_filter(result_filter, start_date, end_date):
     if not start_date or not end_date:
-        start_date = datetime.min.strftime('%Y-%m-%d')
-        end_date = datetime.max.strftime('%Y-%m-%d')
+        start_date = end_date = None
+
+    result_types = None
+    if result_filter and result_filter != 'ALL':
+        result_types = [result_filter.upper()]
 
-    filtered_results = []
-    for ResultTc in ResultTcList:
-        test_date_str = ResultTc[0]
-        test_date = datetime.strptime(test_date_str, "%Y-%m-%d %H:%M:%S,%f").date()
+    return start_date, end_date, result_types
 
-        if not (start_date <= test_date_str[:10] <= end_date):
+# Function to translate a DataTable filter_query into (field, operator, value) backend filters
+def parse_filter_query(filter_query):
+    filters = []
+    for filter_part in (filter_query or '').split(' && '):
+        if not filter_part.strip():
+            continue
+        match = re.match(r'^\s*\{(?P<column>[^}]+)\}\s+(?P<operator>\S+)\s+(?P<value>.*?)\s*$', filter_part)
+        if not match or match['column'] not in RESULT_TABLE_FIELDS:
             continue
 
-        results = ResultTc[1]
-        if result_filter and result_filter != 'ALL':
-            results = [r for r in results if r[7] == result_filter.upper()]
-        filtered_results.append([ResultTc[0], results])
+        operator = match['operator']
+        if operator not in FILTER_OPERATOR_MAP and operator[1:] in FILTER_OPERATOR_MAP and operator[0] in 'is':
+            operator = operator[1:]  # case (in)sensitive variants
+        if operator not in FILTER_OPERATOR_MAP:
+            continue
 
-    return create_impl_base_page(filtered_results)
+        value = match['value']
+        if len(value) >= 2 and value[0] == value[-1] and value[0] in '\'"`':
+            value = value[1:-1]
+        elif RESULT_TABLE_TYPES.get(match['column']) == 'numeric':
+            try:
+                value = float(value)
+            except ValueError:
+                continue
+
+        filters.append((RESULT_TABLE_FIELDS[match['column']], FILTER_OPERATOR_MAP[operator], value))
+    return filters
+
+# Callback to fetch the visible page of a result table
+def update_result_table(page_current, page_size, sort_by, filter_query, tp_name, result_filter, start_date, end_date,
+                        results_changed=None):
+    if not tp_name:
+        return [], 0, 0
+
+    if dash.callback_context.triggered_id in RESULT_FILTER_IDS:
+        # A new filter starts on the first page
+        page_current = 0
+
+    start_date, end_date, result_types = get_result_filter(result_filter, start_date, end_date)
+    sort = [(RESULT_TABLE_FIELDS[s['column_id']], s['direction'] == 'desc')
+            for s in sort_by or [] if s['column_id'] in RESULT_TABLE_FIELDS]
+
+    page_current = page_current or 0
+    results, total = ResultDbClass.queryResultPage([tp_name], start_date, end_date, result_types,
+                                                   parse_filter_query(filter_query), sort,
+                                                   page_current * page_size, page_size)
+    page_count = max(1, -(-total // page_size))
+    if page_current >= page_count:
+        # The column filter shrank the result below the current page
+        return update_result_table(page_count - 1, page_size, sort_by, filter_query,
+                                   tp_name, result_filter, start_date, end_date, results_changed)
+
+    offset = page_current * page_size
+    # 'id' is the result's database key; the table reports it as row_id of the clicked cell
+    data = [{'id': r[0], 'nr': offset + i, 'name': r[2], 'sw': r[3], 'start': r[4], 'end': r[5],
+             'runtime': r[6], 'try': r[8], 'result': r[7]}
+            for i, r in enumerate(results)]
+    return data, page_count, page_current
+
+for table_id in ('result-table-list', 'result-table-time'):
+    callback(
+        [Output(table_id, 'data'), Output(table_id, 'page_count'), Output(table_id, 'page_current')],
+        [Input(table_id, 'page_current'), Input(table_id, 'page_size'),
+         Input(table_id, 'sort_by'), Input(table_id, 'filter_query')] + RESULT_FILTER_INPUTS +
+        [Input('impl-results-changed', 'data')]
+    )(update_result_table)
+
+# Callback to reduce a cell click in either result table to a single "row activated" event carrying the
+# row's key; runs in the browser (assets/UltraTorkWebClientside.js)
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="activate_result_row"),
+    Output('activated-result', 'data'),
+    [Input('result-table-list', 'active_cell'), Input('result-table-time', 'active_cell')],
+    prevent_initial_call=True
+)
 
-# Callback to display detailed information based on the clicked result button
+# Callback to display detailed information about the activated result row
 @callback(
     [Output('main-tabs', 'active_tab'), Output('detailed-info', 'children')],
-    [Input({'type': 'result-button', 'index': ALL}, 'n_clicks')],
-    [State({'type': 'result-button', 'index': ALL}, 'id')]
+    [Input('activated-result', 'data')],
+    prevent_initial_call=True
 )
-def display_detailed_info(n_clicks, ids):
-    ctx = dash.callback_context
-
-    if not ctx.triggered:
+def display_detailed_info(result_id):
+    if result_id is None:
         return dash.no_update, dash.no_update
 
-    button_id = ctx.triggered[0]['prop_id'].split('.')[0]
-    button_index = eval(button_id)['index']
-
-    ResultTcList = GuiDataClass.getTcResultList()
-    result_details = None
-    count = 0
-    for ResultTc in ResultTcList:
-        result = ResultTcList[0]
-
-    for ResultTc in ResultTcList:
-        if count + len(ResultTc[1]) > button_index:
-            result_details = ResultTc[1][button_index - count]
-            break
-        count += len(ResultTc[1])
+    # One primary key lookup, independent of history size and of the filter the table was drawn with
+    result_details = ResultDbClass.getResult(result_id)
+    if result_details is None:
+        return dash.no_update, html.Div("The result no longer exists")
 
     detailed_info = html.Div([
         html.H4(f"Details for Test Case: {result_details[2]}"),
-        html.P(f"Date: {result[0]}"),
+        html.P(f"Date: {result_details[9]}"),
+        html.P(f"SW Version: {result_details[3]}"),
+        html.P(f"Start: {result_details[4]}"),
+        html.P(f"End: {result_details[5]}"),
         html.P(f"Runtime: {result_details[6]}"),
+        html.P(f"Try: {result_details[8]}"),
         html.P(f"Result: {result_details[7]}"),
     ])
     return 'tab-detailed-info', detailed_info
@@ -0,0 +1,124 @@
+import time
+from urllib.parse import quote
+
+import dash
+import dash_bootstrap_components as dbc
+from dash import Input, Output, State, html, dcc, callback, no_update
+
+from UltraTorkWebChrome import CONTENT_STYLE, create_sidebar, icons_stylesheet
+from UltraTorkWebMetrics import timed
+from UltraTorkWebProfiler import PROFILE_ROUTE, UltraTorkWebProfiler
+
+# Admin page, not in the sidebar: /profiles?token=<ProfileToken from UltraTorkWebConfig.json>
+dash.register_page(__name__, path='/profiles')
+
+
+# Function to create the table of the stored profiles with their download links
+def create_profile_table(token):
+    profiles = UltraTorkWebProfiler().listProfiles()
+    if not profiles:
+        return html.P("No profiles stored yet.")
+
+    rows = []
+    for profile in profiles:
+        links = []
+        for name in profile["files"]:
+            links.append(html.A(name.rsplit(".", 1)[1], href="{}/{}?token={}".format(PROFILE_ROUTE, name, quote(token)),
+                                target="_blank", className="me-2"))
+        rows.append(html.Tr([
+            html.Td(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(profile["time"]))),
+            html.Td(profile["callback"]),
+            html.Td(profile["mode"]),
+            html.Td("{:.0f} KB".format(profile["bytes"] / 1024)),
+            html.Td(links),
+        ]))
+    return dbc.Table([html.Thead(html.Tr([html.Th("Time"), html.Th("Callback"), html.Th("Profiler"), html.Th("Size"),
+                                          html.Th("Files")])),
+                      html.Tbody(rows)], bordered=True, hover=True, size="sm")
+
+
+# Function to create the controls that arm the profiler for the next call of a callback
+def create_profile_controls():
+    return dbc.Form([
+        dbc.Row([
+            dbc.Label("Callback", html_for="profile-callback", width=2),
+            dbc.Col(dcc.Dropdown(id="profile-callback", options=UltraTorkWebProfiler().getCallbacks(),
+                                 placeholder="Select a callback"), width=10),
+        ], className="mb-3"),
+        dbc.Row([
+            dbc.Label("Profiler", html_for="profile-mode", width=2),
+            dbc.Col(dbc.RadioItems(id="profile-mode", value="sample", inline=True, options=[
+                {"label": "Sampling (flame graph)", "value": "sample"},
+                {"label": "Deterministic (cProfile)", "value": "cprofile"},
+            ]), width=10),
+        ], className="mb-3"),
+        dbc.Button("Profile next call", id="profile-arm", color="warning", n_clicks=0, className="me-2"),
+        dbc.Button("Cancel", id="profile-disarm", color="secondary", n_clicks=0, className="me-2"),
+        dbc.Button("Refresh list", id="profile-refresh", color="primary", n_clicks=0),
+        html.Div(id="profile-status", className="mt-3"),
+    ])
+
+
+# Function to describe the callbacks waiting for their next call
+def armed_status():
+    armed = UltraTorkWebProfiler().getArmed()
+    if not armed:
+        return dbc.Alert("Profiling is off.", color="light")
+    return dbc.Alert("Waiting for the next call of: " + ", ".join(
+        "{} ({})".format(name, mode) for name, mode in sorted(armed.items())), color="warning")
+
+
+def ProfilesPage(token):
+    if not UltraTorkWebProfiler().isAllowed(token):
+        return html.Div([html.H3("404 - Page not found")], style=CONTENT_STYLE)
+
+    layout = html.Div(
+        [
+            icons_stylesheet(),
+            dcc.Store(id="profile-token", data=token),
+            html.Div(id="sidebar", children=create_sidebar()),
+            html.Div(id="page-content", style=CONTENT_STYLE, children=[
+                dbc.Card([
+                    dbc.CardHeader(html.H2("Callback Profiling")),
+                    dbc.CardBody(create_profile_controls()),
+                ], className="mb-3"),
+                dbc.Card([
+                    dbc.CardHeader(html.H4("Stored profiles")),
+                    dbc.CardBody(html.Div(id="profile-list", children=create_profile_table(token))),
+                ]),
+            ])
+        ]
+    )
+    return layout
+
+
+@timed("layout")
+def layout(token=None, **kwargs):
+    return ProfilesPage(token)
+
+
+# Callback to arm or cancel the profiler and to refresh the list of stored profiles
+@callback(
+    Output("profile-status", "children"),
+    Output("profile-list", "children"),
+    Input("profile-arm", "n_clicks"),
+    Input("profile-disarm", "n_clicks"),
+    Input("profile-refresh", "n_clicks"),
+    State("profile-callback", "value"),
+    State("profile-mode", "value"),
+    State("profile-token", "data"),
+)
+def update_profiler(arm_clicks, disarm_clicks, refresh_clicks, callback_name, mode, token):
+    profiler = UltraTorkWebProfiler()
+    # The page is only served with the token, but the callback route is open to every client
+    if not profiler.isAllowed(token):
+        return no_update, no_update
+
+    triggered = dash.ctx.triggered_id
+    if triggered == "profile-arm":
+        if callback_name not in profiler.getCallbacks():
+            return dbc.Alert("Select a callback first.", color="danger"), no_update
+        profiler.arm(callback_name, mode)
+    elif triggered == "profile-disarm":
+        profiler.disarm()
+    return armed_status(), create_profile_table(token)
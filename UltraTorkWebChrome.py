@@ -0,0 +1,142 @@
+import json
+import logging
+import threading
+import time
+
+import dash_bootstrap_components as dbc
+from dash import html
+from plotly.io.json import to_json_plotly
+
+logger = logging.getLogger(__name__)
+
+# Styles for the sidebar and main content, shared by all pages
+SIDEBAR_STYLE = {
+    "position": "fixed",
+    "top": 0,
+    "left": 0,
+    "bottom": 0,
+    "width": "16rem",
+    "padding": "2rem 1rem",
+    "background-color": "#343a40",  # Darker background
+    "color": "#ffffff",  # White text
+    "transition": "all 0.3s",
+}
+
+CONTENT_STYLE = {
+    "margin-left": "18rem",
+    "margin-right": "2rem",
+    "padding": "2rem 1rem",
+}
+
+ICONS_STYLESHEET = "https://cdn.jsdelivr.net/npm/bootstrap-icons@1.9.0/font/bootstrap-icons.css"
+
+
+class SerializedFragment:
+    """A static component tree that is converted to JSON only once.
+
+    Dash serializes layouts through to_plotly_json(); this returns the tree
+    already converted to plain dicts and lists, so the components are neither
+    rebuilt nor walked again for every page that includes the fragment.
+    """
+
+    def __init__(self, name, component):
+        begin = time.perf_counter()
+        self.json = to_json_plotly(component)
+        self._Data = json.loads(self.json)
+        self.name = name
+        self.serializeMs = (time.perf_counter() - begin) * 1000
+        self.buildMs = 0.0
+
+    def to_plotly_json(self):
+        return self._Data
+
+
+_Fragments = {}
+_FragmentLock = threading.Lock()
+
+
+def cached_fragment(name, build):
+    """Return the fragment build() creates, built and serialized once per process."""
+    fragment = _Fragments.get(name)
+    if fragment is None:
+        with _FragmentLock:
+            fragment = _Fragments.get(name)
+            if fragment is None:
+                begin = time.perf_counter()
+                component = build()
+                build_ms = (time.perf_counter() - begin) * 1000
+                fragment = SerializedFragment(name, component)
+                fragment.buildMs = build_ms
+                logger.info("Fragment %s: build %.2f ms, serialize %.2f ms, %d bytes",
+                            name, build_ms, fragment.serializeMs, len(fragment.json))
+                _Fragments[name] = fragment
+    return fragment
+
+
+def get_fragment_stats():
+    """Build and serialization cost of every fragment built so far."""
+    return {name: {"build_ms": fragment.buildMs, "serialize_ms": fragment.serializeMs, "bytes": len(fragment.json)}
+            for name, fragment in _Fragments.items()}
+
+
+def create_sidebar_menu():
+    """Logo, navigation links and the testing menu offcanvas."""
+    offcanvas = dbc.Offcanvas(
+        [
+            dbc.NavItem(dbc.NavLink(
+                [html.I(className="bi bi-caret-right-fill me-2"), "Database Settings"],
+                href="/config_database",
+                id="database-settings-link"
+            )),
+            dbc.Tooltip("Configure database settings", target="database-settings-link"),
+
+            dbc.NavItem(dbc.NavLink(
+                [html.I(className="bi bi-gear-fill me-2"), "Testplace Configuration"],
+                href="/config_tp",
+                id="testplace-config-link"
+            )),
+            dbc.Tooltip("Configure testplaces", target="testplace-config-link"),
+
+            dbc.NavItem(dbc.NavLink(
+                [html.I(className="bi bi-pencil-square me-2"), "Edit Testplace"],
+                href="/impl",
+                id="edit-testplace-link"
+            )),
+            dbc.Tooltip("Edit testplaces", target="edit-testplace-link"),
+        ],
+        id="offcanvas",
+        title="Testing Menu",
+        is_open=False,
+        style={"background-color": "#343a40", "color": "#ffffff"}  # Darker offcanvas
+    )
+
+    return html.Div(
+        [
+            html.Img(src="/static/images/ultratronikLogoU.png", height="60px", style={"margin-bottom": "20px"}),
+            dbc.NavbarBrand("UltraTorkWeb", className="ms-2", style={"font-size": "21px", "font-weight": "bold"}),
+            dbc.Nav(
+                [
+                    dbc.NavLink("Dashboard", href="/", className="bi bi-house", id="dashboard-link"),
+                    dbc.Tooltip("Go to the dashboard", target="dashboard-link"),
+
+                    dbc.NavLink("Testing Menu", href="/", id="open-offcanvas", className="bi bi-geo-alt", active=True),
+                    dbc.Tooltip("Open testing menu", target="open-offcanvas"),
+
+                    dbc.NavLink("Documentation", href="/documentation", className="bi bi-pen", id="documentation-link"),
+                    dbc.Tooltip("View documentation", target="documentation-link"),
+                ],
+                vertical=True,
+                pills=True,
+            ),
+            offcanvas,
+        ]
+    )
+
+
+def create_sidebar(*sections):
+    """Sidebar shared by all pages, followed by the page specific sections."""
+    return html.Div([cached_fragment("sidebar-menu", create_sidebar_menu), *sections], style=SIDEBAR_STYLE)
+
+
+def icons_stylesheet():
+    return cached_fragment("icons-stylesheet", lambda: html.Link(href=ICONS_STYLESHEET, rel="stylesheet"))
@@ -0,0 +1,132 @@
+import copy
+import json
+import os
+import stat
+import tempfile
+import threading
+
+try:
+    import fcntl
+except ImportError:  # not available on Windows; writes are then only serialized within the process
+    fcntl = None
+
+# Mode of a config file update() creates; an existing file keeps its own mode
+CONFIG_FILE_MODE = 0o644
+
+
+class UltraTorkWebConfigStore:
+    """Parsed UltraTorkWebConfig.json shared by all pages.
+
+    Shared like UltraTorkWebGuiIf: main.py sets the file path once with
+    setPath(). read() returns the cached content and parses the file again
+    only when its mtime or size changed. update() serializes writers behind
+    a lock and replaces the file atomically, so readers never see a
+    half-written file. A file that is not valid JSON (e.g. after a typo in a
+    hand edit) raises ValueError and is never written over.
+    """
+
+    _Path = None
+    _Data = {}
+    _Stamp = None
+    _ReadLock = threading.Lock()
+    _WriteLock = threading.Lock()
+
+    def setPath(self, Path):
+        with self._ReadLock:
+            UltraTorkWebConfigStore._Path = os.path.abspath(Path)
+            UltraTorkWebConfigStore._Data = {}
+            UltraTorkWebConfigStore._Stamp = None
+
+    def getPath(self):
+        if self._Path is None:
+            raise RuntimeError("UltraTorkWebConfigStore: no path set")
+        return self._Path
+
+    def _stamp(self):
+        try:
+            st = os.stat(self.getPath())
+        except FileNotFoundError:
+            return None
+        return st.st_mtime_ns, st.st_size
+
+    def read(self):
+        """Return the parsed config. The returned dict is shared; do not modify it, use update().
+
+        Raises ValueError if the file is not valid JSON.
+        """
+        stamp = self._stamp()
+        if stamp == self._Stamp:
+            return self._Data
+
+        with self._ReadLock:
+            stamp = self._stamp()
+            if stamp != self._Stamp:
+                data = {}
+                if stamp is not None:
+                    try:
+                        with open(self.getPath(), 'r') as json_file:
+                            data = json.load(json_file)
+                    except json.JSONDecodeError as e:
+                        raise ValueError("{} is not valid JSON: {}".format(self.getPath(), e)) from e
+                UltraTorkWebConfigStore._Data = data
+                UltraTorkWebConfigStore._Stamp = stamp
+            return self._Data
+
+    def update(self, Mutate):
+        """Apply Mutate(config) to a copy of the config and write it back atomically.
+
+        Mutate changes the dict in place; its return value is passed through. If it
+        returns False the file is left unchanged.
+        """
+        with self._WriteLock, self._fileLock():
+            data = copy.deepcopy(self.read())
+            result = Mutate(data)
+            if result is False:
+                return result
+
+            directory = os.path.dirname(self.getPath())
+            try:
+                mode = stat.S_IMODE(os.stat(self.getPath()).st_mode)
+            except FileNotFoundError:
+                mode = CONFIG_FILE_MODE
+            fd, tmp_path = tempfile.mkstemp(prefix=".UltraTorkWebConfig.", suffix=".tmp", dir=directory)
+            try:
+                with os.fdopen(fd, 'w') as json_file:
+                    json.dump(data, json_file, indent=4)
+                    json_file.flush()
+                    os.fsync(json_file.fileno())
+                # mkstemp creates the file 0600, the replaced config stays readable for other users
+                os.chmod(tmp_path, mode)
+                os.replace(tmp_path, self.getPath())
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+            with self._ReadLock:
+                UltraTorkWebConfigStore._Data = data
+                UltraTorkWebConfigStore._Stamp = self._stamp()
+            return result
+
+    def _fileLock(self):
+        # Serializes writers of other processes (multi-worker serving) on a lock file next to the config
+        return _FileLock(self.getPath() + ".lock")
+
+
+class _FileLock:
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            self.file = open(self.path, 'a')
+            fcntl.flock(self.file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+        return False
@@ -0,0 +1,84 @@
+import numpy as np
+import plotly.graph_objects as go
+
+from UltraTorkWebMetrics import timed
+
+# Line figures with more points than this are drawn with WebGL (Scattergl)
+SCATTERGL_THRESHOLD = 1000
+
+# Bar labels are only attached while there are few enough bars for the text to be readable
+BAR_TEXT_THRESHOLD = 60
+
+FIGURE_LAYOUT = dict(
+    plot_bgcolor='#f4f4f4',  # Light background
+    paper_bgcolor='#ffffff',  # White background
+)
+
+
+def date_array(dates):
+    """"YYYY-MM-DD[ HH:MM]" strings (or dates) as epoch milliseconds for a date axis.
+
+    Plotly sends numeric arrays as packed binary, which is far smaller than
+    one date string per point.
+    """
+    return np.asarray(dates, dtype="datetime64[ms]").astype(np.float64)
+
+
+@timed("figure")
+def message_figure(title):
+    """Empty figure that only shows a title, e.g. for errors."""
+    return go.Figure(layout=dict(title=title))
+
+
+@timed("figure")
+def bar_figure(title, x, series, text=None):
+    """Grouped bar figure with one trace per series.
+
+    x is the shared date array, series maps the trace name to its y array
+    and text is an optional label array for the bars; it is dropped when
+    there are too many bars for the labels to be visible.
+    """
+    show_text = text is not None and len(x) * len(series) <= BAR_TEXT_THRESHOLD
+    traces = [go.Bar(name=name, x=x, y=y, offsetgroup=name, text=text if show_text else None)
+              for name, y in series.items()]
+
+    fig = go.Figure(data=traces)
+    fig.update_layout(
+        title=title,
+        barmode='group',
+        xaxis=dict(type='date', title='Date'),
+        yaxis=dict(title='Count'),
+        legend_title_text='Result Type',
+        **FIGURE_LAYOUT
+    )
+    return fig
+
+
+@timed("figure")
+def pie_figure(title, labels, values):
+    fig = go.Figure(data=[go.Pie(labels=labels, values=values)])
+    fig.update_layout(title=title)
+    return fig
+
+
+@timed("figure")
+def line_figure(title, lines, uirevision=None):
+    """Line figure with markers; lines is a list of (name, x date array, y array).
+
+    Figures with the same uirevision keep the zoom range the user has set.
+
+    Above SCATTERGL_THRESHOLD points in total the traces are drawn with WebGL.
+    """
+    points = sum(len(x) for _, x, _ in lines)
+    trace = go.Scattergl if points > SCATTERGL_THRESHOLD else go.Scatter
+
+    fig = go.Figure(data=[trace(name=name, x=x, y=y, mode='lines+markers') for name, x, y in lines])
+    fig.update_layout(
+        title=title,
+        xaxis=dict(type='date', title='Date'),
+        yaxis=dict(title='Count'),
+        legend_title_text='Testplace',
+        uirevision=uirevision,  # keeps the zoom when the figure is replaced with other buckets
+        **FIGURE_LAYOUT
+    )
+    return fig
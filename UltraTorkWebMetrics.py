@@ -0,0 +1,261 @@
+import contextvars
+import functools
+import inspect
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Upper bounds of the latency (seconds) and response size (bytes) histogram buckets
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# URL of the metrics and the Dash route the callbacks are served under
+METRICS_ROUTE = "/metrics"
+CALLBACK_ROUTE = "/_dash-update-component"
+
+# Background callback jobs whose start is remembered until their result is fetched
+MAX_PENDING_JOBS = 1000
+
+# Label of requests for outputs the app has no callback for; the output comes from the client, so
+# using it as the label would let any client create new time series
+UNKNOWN_CALLBACK = "unknown"
+
+# Callback the current request (and the query pool threads working for it) belongs to
+current_callback = contextvars.ContextVar("current_callback", default="")
+
+
+def callback_label(func):
+    """Name of a callback function in the metrics and profiles: "module.function"."""
+    return "{}.{}".format(func.__module__, func.__name__)
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def format_labels(labels):
+    return "{" + ",".join('{}="{}"'.format(name, escape_label(value)) for name, value in labels) + "}"
+
+
+class Histogram:
+    """Cumulative Prometheus histogram of one label set."""
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        else:
+            self.counts[-1] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        total = 0
+        for bound, count in zip(self.buckets + ("+Inf",), self.counts):
+            total += count
+            yield "{}_bucket{} {}".format(name, format_labels(labels + (("le", bound),)), total)
+        yield "{}_sum{} {}".format(name, format_labels(labels), self.sum)
+        yield "{}_count{} {}".format(name, format_labels(labels), total)
+
+
+class UltraTorkWebMetrics:
+    """Latency, response size and error metrics of the Dash callbacks in Prometheus text format.
+
+    Shared like UltraTorkWebResultStream: main.py registers the route once.
+    Every request to the callback route is timed with its response size and
+    counted as an error for a 5xx status; background callbacks are timed from
+    the start of the job to the request that fetches the result. Functions
+    wrapped with timed() add their time to the phase they belong to ("guiif",
+    "database", "figure", "layout"), per callback, so the latency of a callback
+    can be split into where it is spent. Other parts of the app add their own
+    counters and gauges with addCollector().
+    """
+
+    _Lock = threading.Lock()
+    _Latency = {}
+    _Size = {}
+    _Errors = {}
+    _PhaseSeconds = {}
+    _PhaseCalls = {}
+    _Jobs = OrderedDict()
+    _Names = {}
+    _Collectors = []
+
+    def observeCallback(self, Callback, Seconds, Bytes=None, Error=False):
+        with self._Lock:
+            self._Latency.setdefault(Callback, Histogram(LATENCY_BUCKETS)).observe(Seconds)
+            if Bytes is not None:
+                self._Size.setdefault(Callback, Histogram(SIZE_BUCKETS)).observe(Bytes)
+            if Error:
+                self._Errors[Callback] = self._Errors.get(Callback, 0) + 1
+
+    def observePhase(self, Phase, Function, Seconds):
+        key = (current_callback.get(), Phase, Function)
+        with self._Lock:
+            self._PhaseSeconds[key] = self._PhaseSeconds.get(key, 0.0) + Seconds
+            self._PhaseCalls[key] = self._PhaseCalls.get(key, 0) + 1
+
+    def addCollector(self, Collect):
+        """Add the samples of Collect() to every render(): (metric, type, help, value) tuples."""
+        with self._Lock:
+            self._Collectors.append(Collect)
+
+    def render(self):
+        """All metrics as Prometheus text exposition."""
+        with self._Lock:
+            latency = list(self._Latency.items())
+            size = list(self._Size.items())
+            errors = list(self._Errors.items())
+            phase_seconds = list(self._PhaseSeconds.items())
+            phase_calls = list(self._PhaseCalls.items())
+            collectors = list(self._Collectors)
+
+        lines = ["# HELP ultratork_callback_duration_seconds Latency of the Dash callbacks.",
+                 "# TYPE ultratork_callback_duration_seconds histogram"]
+        for callback, histogram in sorted(latency):
+            lines.extend(histogram.lines("ultratork_callback_duration_seconds", (("callback", callback),)))
+
+        lines += ["# HELP ultratork_callback_response_bytes Size of the responses of the Dash callbacks.",
+                  "# TYPE ultratork_callback_response_bytes histogram"]
+        for callback, histogram in sorted(size):
+            lines.extend(histogram.lines("ultratork_callback_response_bytes", (("callback", callback),)))
+
+        lines += ["# HELP ultratork_callback_errors_total Dash callback requests that failed.",
+                  "# TYPE ultratork_callback_errors_total counter"]
+        lines += ["ultratork_callback_errors_total{} {}".format(format_labels((("callback", callback),)), count)
+                  for callback, count in sorted(errors)]
+
+        lines += ["# HELP ultratork_phase_seconds_total Time spent per phase and function, per callback.",
+                  "# TYPE ultratork_phase_seconds_total counter"]
+        lines += ["ultratork_phase_seconds_total{} {}".format(
+            format_labels((("callback", c), ("phase", p), ("function", f))), seconds)
+            for (c, p, f), seconds in sorted(phase_seconds)]
+
+        lines += ["# HELP ultratork_phase_calls_total Calls per phase and function, per callback.",
+                  "# TYPE ultratork_phase_calls_total counter"]
+        lines += ["ultratork_phase_calls_total{} {}".format(
+            format_labels((("callback", c), ("phase", p), ("function", f))), calls)
+            for (c, p, f), calls in sorted(phase_calls)]
+
+        for collect in collectors:
+            try:
+                samples = collect()
+            except Exception:
+                logger.exception("Collecting metrics with %r failed", collect)
+                continue
+            for name, kind, help_text, value in samples:
+                lines += ["# HELP {} {}".format(name, help_text), "# TYPE {} {}".format(name, kind),
+                          "{} {}".format(name, value)]
+        return "\n".join(lines) + "\n"
+
+    def _callbackName(self, app, Output):
+        name = self._Names.get(Output)
+        if name is None:
+            func = app.callback_map.get(Output, {}).get("callback")
+            if func is None:
+                return UNKNOWN_CALLBACK
+            name = self._Names[Output] = callback_label(func)
+        return name
+
+    def _isBackground(self, app, Output):
+        return bool(app.callback_map.get(Output, {}).get("background"))
+
+    def registerRoute(self, app):
+        """Time the callback requests of a Dash app and serve the metrics under METRICS_ROUTE."""
+        from flask import Response, g, request
+
+        server = app.server
+
+        def before_request():
+            if request.path.endswith(CALLBACK_ROUTE) and request.method == "POST":
+                body = request.get_json(silent=True) or {}
+                g.metrics_output = body.get("output", "")
+                g.metrics_start = time.perf_counter()
+                g.metrics_token = current_callback.set(self._callbackName(app, g.metrics_output))
+
+        def after_request(response):
+            start = g.pop("metrics_start", None)
+            if start is None:
+                return response
+            output = g.pop("metrics_output")
+            callback = self._callbackName(app, output)
+            seconds = time.perf_counter() - start
+            error = response.status_code >= 500
+
+            if self._isBackground(app, output) and not error:
+                # The job runs on; its latency counts from the start to the request that fetches the result
+                job = request.args.get("job")
+                body = response.get_json(silent=True) if response.status_code == 200 else None
+                with self._Lock:
+                    if job is None:
+                        if body and "job" in body:
+                            self._Jobs[str(body["job"])] = start
+                            while len(self._Jobs) > MAX_PENDING_JOBS:
+                                self._Jobs.popitem(last=False)
+                        return response
+                    # Polls of a running job only report progress; 204 is a job that updated nothing
+                    if response.status_code != 204 and (not body or "response" not in body):
+                        return response
+                    start = self._Jobs.pop(job, start)
+                seconds = time.perf_counter() - start
+
+            self.observeCallback(callback, seconds, response.calculate_content_length(), error)
+            return response
+
+        def teardown_request(exc):
+            token = g.pop("metrics_token", None)
+            if token is not None:
+                try:
+                    current_callback.reset(token)
+                except ValueError:
+                    pass  # torn down in another context than the request was started in
+
+        def metrics():
+            return Response(self.render(), mimetype="text/plain; version=0.0.4")
+
+        server.before_request(before_request)
+        server.after_request(after_request)
+        server.teardown_request(teardown_request)
+        server.add_url_rule(METRICS_ROUTE, "metrics", metrics)
+
+    @classmethod
+    def _afterFork(cls):
+        cls._Lock = threading.Lock()
+
+
+def timed(phase):
+    """Decorator adding the time of every call to a phase of UltraTorkWebMetrics."""
+    def decorator(func):
+        # Methods are named by their class, functions (e.g. the "layout" of every page) by their module
+        name = func.__qualname__ if "." in func.__qualname__ else "{}.{}".format(func.__module__, func.__qualname__)
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                UltraTorkWebMetrics().observePhase(phase, name, time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+def instrument_class(cls, phase):
+    """Time all public methods of a class we do not own (e.g. UltraTorkWebGuiIf) as a phase."""
+    for name, member in list(vars(cls).items()):
+        if not name.startswith("_") and inspect.isfunction(member):
+            setattr(cls, name, timed(phase)(member))
+    return cls
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=UltraTorkWebMetrics._afterFork)
@@ -0,0 +1,399 @@
+import contextvars
+import cProfile
+import functools
+import hmac
+import html
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+
+from UltraTorkWebMetrics import callback_label
+
+logger = logging.getLogger(__name__)
+
+# Defaults of the profile directory ("ProfileMaxCount", "ProfileMaxMB" and "ProfileSampleMs" in
+# UltraTorkWebConfig.json); profiling is only available with a "ProfileToken"
+PROFILE_MAX_COUNT = 20
+PROFILE_MAX_MB = 100
+PROFILE_SAMPLE_MS = 2.0
+
+# Profilers: "sample" records stacks for a flame graph, "cprofile" counts every call
+PROFILE_MODES = ("sample", "cprofile")
+
+# URL prefix the profile files are downloaded from
+PROFILE_ROUTE = "/profiles/files"
+
+PROFILE_NAME = re.compile(r"^(?P<stem>\d{8}-\d{6}-\d+-(?P<callback>[A-Za-z0-9_.]+)-(?P<mode>sample|cprofile))"
+                          r"\.(folded|svg|prof|txt)$")
+
+# Marker of an armed callback in the profile directory, seen by every server process
+ARMED_NAME = re.compile(r"^(?P<callback>[A-Za-z0-9_.]+)\.(?P<mode>sample|cprofile)\.armed$")
+
+# Threads sampled besides the one running the callback: the query pool of UltraTorkWebResultDb
+SAMPLED_THREAD_PREFIXES = ("ResultDb",)
+
+# Profile the background job started by the current request: (callback, mode)
+job_profile = contextvars.ContextVar("job_profile", default=None)
+
+
+def frame_label(code):
+    return "{} ({}:{})".format(code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class StackSampler:
+    """Records the stacks of a thread (and of the query pool) at a fixed interval, in folded format."""
+
+    def __init__(self, Interval, ThreadId=None):
+        self.Interval = Interval
+        self.ThreadId = ThreadId if ThreadId is not None else threading.get_ident()
+        self.stacks = Counter()
+        self._Stop = threading.Event()
+        self._Thread = threading.Thread(target=self._run, name="ProfileSampler", daemon=True)
+
+    def start(self):
+        self._Thread.start()
+
+    def stop(self):
+        self._Stop.set()
+        self._Thread.join()
+        return self.stacks
+
+    def _run(self):
+        names = {}
+        while not self._Stop.wait(self.Interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id != self.ThreadId:
+                    if thread_id not in names:
+                        names.update((t.ident, t.name) for t in threading.enumerate())
+                    if not names.get(thread_id, "").startswith(SAMPLED_THREAD_PREFIXES):
+                        continue
+                    if os.path.basename(frame.f_code.co_filename) in ("threading.py", "queue.py"):
+                        continue  # idle pool thread
+                stack = []
+                while frame is not None:
+                    stack.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                thread = "request" if thread_id == self.ThreadId else names.get(thread_id, str(thread_id))
+                self.stacks[";".join([thread] + stack[::-1])] += 1
+
+
+def flame_graph_svg(stacks, title, width=1200, row=16):
+    """Self-contained SVG flame graph of folded stacks; the title of every frame shows its samples."""
+    root = {"count": 0, "children": {}}
+    depth = 0
+    for stack, count in stacks.items():
+        node = root
+        node["count"] += count
+        frames = stack.split(";")
+        depth = max(depth, len(frames))
+        for name in frames:
+            node = node["children"].setdefault(name, {"count": 0, "children": {}})
+            node["count"] += count
+
+    total = max(root["count"], 1)
+    height = (depth + 1) * row + 30
+    parts = ['<svg xmlns="http://www.w3.org/2000/svg" width="{}" height="{}" font-family="monospace" '
+             'font-size="11">'.format(width, height),
+             '<text x="4" y="16" font-size="14">{}</text>'.format(html.escape(title))]
+
+    pending = [("all", root, 0.0, 0)]
+    while pending:
+        name, node, x, level = pending.pop()
+        w = node["count"] / total * width
+        if w < 0.5:
+            continue
+        y = height - (level + 1) * row
+        hue = zlib.crc32(name.split(" (")[0].encode()) % 60
+        label = name if len(name) * 7 < w else name[:int(w / 7) - 2] + ".." if w > 28 else ""
+        parts.append('<g><title>{} ({} samples, {:.1f}%)</title><rect x="{:.1f}" y="{}" width="{:.1f}" height="{}" '
+                     'fill="hsl({},90%,60%)" stroke="white" stroke-width="0.5"/><text x="{:.1f}" y="{}">{}</text></g>'
+                     .format(html.escape(name), node["count"], 100.0 * node["count"] / total, x, y, w, row - 1,
+                             hue, x + 3, y + row - 4, html.escape(label)))
+        child_x = x
+        for child_name, child in sorted(node["children"].items()):
+            pending.append((child_name, child, child_x, level + 1))
+            child_x += child["count"] / total * width
+    parts.append("</svg>")
+    return "\n".join(parts)
+
+
+class UltraTorkWebProfiler:
+    """Runs the next call of a chosen Dash callback under a profiler.
+
+    Shared like UltraTorkWebConfigStore: main.py sets the directory once
+    with setPath() and registers the routes. An admin arms a callback on the
+    /profiles page (Profiles.py), which leaves a marker file in the profile
+    directory, so every server process sees it. Each callback request
+    compares the mtime of the directory with the last one seen (one stat());
+    only while a callback is armed are the Dash callback route and, for
+    background callbacks, the job start of the callback manager replaced
+    with profiling versions. The process that removes the marker first
+    profiles the call, and the routes are restored once nothing is armed.
+
+    Background jobs are profiled in the job process. Profiles are kept in the
+    directory below ProfileMaxCount profiles and ProfileMaxMB, oldest first.
+    """
+
+    _Path = None
+    _Token = None
+    _MaxCount = PROFILE_MAX_COUNT
+    _MaxBytes = PROFILE_MAX_MB * 1024 * 1024
+    _Interval = PROFILE_SAMPLE_MS / 1000
+    _Armed = {}
+    _Synced = None
+    _Lock = threading.Lock()
+    _App = None
+    _Installed = None
+
+    def setPath(self, Path, ParameterList=None):
+        ParameterList = ParameterList or {}
+        UltraTorkWebProfiler._Path = os.path.abspath(Path)
+        UltraTorkWebProfiler._Token = ParameterList.get("ProfileToken") or None
+        UltraTorkWebProfiler._MaxCount = max(1, int(ParameterList.get("ProfileMaxCount", PROFILE_MAX_COUNT)))
+        UltraTorkWebProfiler._MaxBytes = int(float(ParameterList.get("ProfileMaxMB", PROFILE_MAX_MB)) * 1024 * 1024)
+        UltraTorkWebProfiler._Interval = float(ParameterList.get("ProfileSampleMs", PROFILE_SAMPLE_MS)) / 1000
+        UltraTorkWebProfiler._Synced = None
+        if self._Token is not None:
+            os.makedirs(self._Path, exist_ok=True)
+
+    def isAllowed(self, Token):
+        """True if profiling is configured and Token is the "ProfileToken"."""
+        return (self._Token is not None and self._Path is not None and Token is not None
+                and hmac.compare_digest(str(Token), str(self._Token)))
+
+    def getCallbacks(self):
+        """Names of the server side callbacks of the app that can be profiled."""
+        if self._App is None:
+            return []
+        return sorted({callback_label(entry["callback"]) for entry in self._App.callback_map.values()
+                       if entry.get("callback") is not None})
+
+    def arm(self, Callback, Mode="sample"):
+        """Profile the next call of Callback, in whichever server process it runs."""
+        if Mode not in PROFILE_MODES:
+            raise ValueError("Unknown profile mode: {}".format(Mode))
+        if not ARMED_NAME.match("{}.{}.armed".format(Callback, Mode)):
+            raise ValueError("Callback name not usable in a file name: {}".format(Callback))
+        self.disarm(Callback)
+        with open(self._marker(Callback, Mode), "w"):
+            pass
+        self._sync()
+
+    def disarm(self, Callback=None):
+        """Cancel the armed call of Callback, or of all callbacks."""
+        for callback, mode in self.getArmed().items():
+            if Callback is None or callback == Callback:
+                try:
+                    os.remove(self._marker(callback, mode))
+                except FileNotFoundError:
+                    pass  # called or cancelled meanwhile
+        self._sync()
+
+    def getArmed(self):
+        """Armed callbacks of all server processes: {callback: mode}."""
+        if self._Path is None or not os.path.isdir(self._Path):
+            return {}
+        armed = {}
+        with os.scandir(self._Path) as entries:
+            for entry in entries:
+                match = ARMED_NAME.match(entry.name)
+                if match is not None:
+                    armed[match["callback"]] = match["mode"]
+        return armed
+
+    def _marker(self, Callback, Mode):
+        return os.path.join(self._Path, "{}.{}.armed".format(Callback, Mode))
+
+    def _sync(self):
+        # Follow the markers of the directory: install the profiling route while a callback is armed
+        try:
+            mtime = os.stat(self._Path).st_mtime_ns
+        except (OSError, TypeError):
+            return
+        with self._Lock:
+            if mtime == self._Synced:
+                return
+            UltraTorkWebProfiler._Synced = mtime
+            UltraTorkWebProfiler._Armed = self.getArmed()
+            if self._Armed:
+                self._install()
+            else:
+                self._uninstall()
+
+    def _claim(self, Callback):
+        # Only the process that removes the marker profiles the call
+        with self._Lock:
+            mode = self._Armed.pop(Callback, None)
+        if mode is None:
+            return None
+        try:
+            os.remove(self._marker(Callback, mode))
+        except FileNotFoundError:
+            return None
+        return mode
+
+    def listProfiles(self):
+        """Profiles in the directory, newest first: {"name", "callback", "mode", "time", "files", "bytes"}."""
+        if self._Path is None or not os.path.isdir(self._Path):
+            return []
+        profiles = {}
+        with os.scandir(self._Path) as entries:
+            for entry in entries:
+                match = PROFILE_NAME.match(entry.name)
+                if match is None:
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue  # evicted by another process meanwhile
+                profile = profiles.setdefault(match["stem"], {
+                    "name": match["stem"], "callback": match["callback"], "mode": match["mode"],
+                    "time": stat.st_mtime, "files": [], "bytes": 0})
+                profile["files"].append(entry.name)
+                profile["bytes"] += stat.st_size
+        for profile in profiles.values():
+            profile["files"].sort()
+        return sorted(profiles.values(), key=lambda p: p["name"], reverse=True)
+
+    def _evict(self):
+        profiles = self.listProfiles()
+        total = sum(p["bytes"] for p in profiles)
+        while profiles and (len(profiles) > self._MaxCount or total > self._MaxBytes):
+            oldest = profiles.pop()
+            total -= oldest["bytes"]
+            for name in oldest["files"]:
+                try:
+                    os.remove(os.path.join(self._Path, name))
+                except FileNotFoundError:
+                    pass
+
+    def profile(self, Callback, Mode, func, *args, **kwargs):
+        """Run func under the profiler of Mode and store the profile; returns what func returns."""
+        stem = "{}-{}-{}-{}".format(time.strftime("%Y%m%d-%H%M%S"), os.getpid(), Callback, Mode)
+        begin = time.perf_counter()
+        if Mode == "cprofile":
+            profiler = cProfile.Profile()
+            try:
+                return profiler.runcall(func, *args, **kwargs)
+            finally:
+                self._save(stem, Callback, time.perf_counter() - begin, profiler=profiler)
+        sampler = StackSampler(self._Interval)
+        sampler.start()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self._save(stem, Callback, time.perf_counter() - begin, stacks=sampler.stop())
+
+    def _save(self, stem, Callback, Seconds, profiler=None, stacks=None):
+        path = os.path.join(self._Path, stem)
+        try:
+            if profiler is not None:
+                profiler.dump_stats(path + ".prof")
+                summary = io.StringIO()
+                pstats.Stats(profiler, stream=summary).sort_stats("cumulative").print_stats(60)
+                with open(path + ".txt", "w") as f:
+                    f.write("{} took {:.1f} ms\n{}".format(Callback, Seconds * 1000, summary.getvalue()))
+            else:
+                with open(path + ".folded", "w") as f:
+                    f.writelines("{} {}\n".format(stack, count) for stack, count in sorted(stacks.items()))
+                with open(path + ".svg", "w") as f:
+                    f.write(flame_graph_svg(stacks, "{} took {:.1f} ms, {} samples".format(
+                        Callback, Seconds * 1000, sum(stacks.values()))))
+            logger.info("Profile of %s stored as %s", Callback, path)
+            self._evict()
+        except Exception:
+            logger.exception("Storing the profile of %s failed", Callback)
+
+    def _install(self):
+        # Called with _Lock held: replace the callback route and the job start of the managers
+        if self._Installed is not None or self._App is None:
+            return
+        app = self._App
+        endpoint = app.config.routes_pathname_prefix + "_dash-update-component"
+        dispatch = app.server.view_functions[endpoint]
+        managers = {id(m): m for m in [app._background_manager] +
+                    [entry.get("manager") for entry in app.callback_map.values()] if m is not None}
+
+        def profiled_dispatch(*args, **kwargs):
+            return self._dispatch(dispatch, *args, **kwargs)
+
+        for manager in managers.values():
+            manager.call_job_fn = functools.partial(self._callJobFn, manager.call_job_fn)
+        app.server.view_functions[endpoint] = profiled_dispatch
+        UltraTorkWebProfiler._Installed = (endpoint, dispatch, list(managers.values()))
+
+    def _uninstall(self):
+        if self._Installed is None:
+            return
+        endpoint, dispatch, managers = self._Installed
+        self._App.server.view_functions[endpoint] = dispatch
+        for manager in managers:
+            del manager.call_job_fn  # back to the method of the class
+        UltraTorkWebProfiler._Installed = None
+
+    def _dispatch(self, dispatch, *args, **kwargs):
+        from flask import request
+
+        body = request.get_json(silent=True) or {}
+        entry = self._App.callback_map.get(body.get("output"), {})
+        func = entry.get("callback")
+        mode = None
+        # Polls of a running background job carry its id; only the request starting a job is profiled
+        if func is not None and request.args.get("job") is None:
+            mode = self._claim(callback_label(func))
+        if mode is None:
+            return dispatch(*args, **kwargs)
+
+        try:
+            if entry.get("background"):
+                token = job_profile.set((callback_label(func), mode))
+                try:
+                    return dispatch(*args, **kwargs)
+                finally:
+                    job_profile.reset(token)
+            return self.profile(callback_label(func), mode, dispatch, *args, **kwargs)
+        finally:
+            self._sync()
+
+    def _callJobFn(self, call_job_fn, key, job_fn, args, context):
+        job = job_profile.get()
+        if job is not None:
+            # The job process is forked from this one and profiles the whole job there
+            job_fn = functools.partial(self.profile, job[0], job[1], job_fn)
+        return call_job_fn(key, job_fn, args, context)
+
+    def registerRoute(self, app):
+        """Remember the Dash app and serve the profile files under PROFILE_ROUTE to the admin."""
+        from flask import abort, request, send_from_directory
+
+        UltraTorkWebProfiler._App = app
+        endpoint = app.config.routes_pathname_prefix + "_dash-update-component"
+
+        @app.server.before_request
+        def follow_armed():
+            # Callbacks armed by another server process are noticed with their next request
+            if self._Token is not None and request.endpoint == endpoint:
+                self._sync()
+
+        def profile_file(name):
+            if not self.isAllowed(request.args.get("token")) or not PROFILE_NAME.match(name):
+                abort(404)
+            as_attachment = not name.endswith(".svg")
+            return send_from_directory(self._Path, name, as_attachment=as_attachment, max_age=0)
+
+        app.server.add_url_rule(PROFILE_ROUTE + "/<name>", "profile_file", profile_file)
+
+    @classmethod
+    def _afterFork(cls):
+        cls._Lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=UltraTorkWebProfiler._afterFork)
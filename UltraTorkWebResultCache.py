@@ -0,0 +1,87 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+def estimate_size(value):
+    """Rough size in bytes of a query result made of lists, tuples, dicts and scalars."""
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        for key, item in value.items():
+            size += estimate_size(key) + estimate_size(item)
+    elif isinstance(value, (list, tuple)):
+        for item in value:
+            size += estimate_size(item)
+    return size
+
+
+class ResultCache:
+    """Bounded LRU cache for result queries with a time-to-live.
+
+    Every entry remembers the change token of the database at the time it
+    was filled; get() only returns it while the token passed in still matches.
+    """
+
+    def __init__(self, MaxEntries=256, MaxBytes=64 * 1024 * 1024, Ttl=300.0):
+        self.MaxEntries = MaxEntries
+        self.MaxBytes = MaxBytes
+        self.Ttl = Ttl
+        self._Entries = OrderedDict()
+        self._Bytes = 0
+        self._Lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key, token):
+        """Return (True, value) for a valid entry, otherwise (False, None)."""
+        with self._Lock:
+            entry = self._Entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return False, None
+
+            entry_token, value, size, expires = entry
+            if expires < time.monotonic() or entry_token != token:
+                self._remove(key)
+                self.invalidations += 1
+                self.misses += 1
+                return False, None
+
+            self._Entries.move_to_end(key)
+            self.hits += 1
+            return True, value
+
+    def put(self, key, token, value):
+        size = estimate_size(value)
+        with self._Lock:
+            if key in self._Entries:
+                self._remove(key)
+            if size > self.MaxBytes:
+                return
+            self._Entries[key] = (token, value, size, time.monotonic() + self.Ttl)
+            self._Bytes += size
+            while len(self._Entries) > self.MaxEntries or self._Bytes > self.MaxBytes:
+                self._remove(next(iter(self._Entries)))
+                self.evictions += 1
+
+    def clear(self):
+        with self._Lock:
+            self._Entries.clear()
+            self._Bytes = 0
+
+    def _remove(self, key):
+        self._Bytes -= self._Entries.pop(key)[2]
+
+    def stats(self):
+        with self._Lock:
+            return {
+                "entries": len(self._Entries),
+                "bytes": self._Bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
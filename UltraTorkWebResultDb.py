@@ -0,0 +1,865 @@
+import contextlib
+import contextvars
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, datetime, timedelta
+
+from UltraTorkWebMetrics import timed
+from UltraTorkWebResultCache import ResultCache
+
+logger = logging.getLogger(__name__)
+
+# Default size of the pool that fetches testplaces concurrently ("QueryWorkers" in UltraTorkWebConfig.json)
+QUERY_WORKERS = 4
+
+# Default number of idle database connections kept for reuse ("DBConnections" in UltraTorkWebConfig.json);
+# more are opened under load and closed again when the pool is full
+DB_CONNECTIONS = 8
+
+# Seconds after which a result id is assumed to be committed together with every lower id, on MySQL
+# ("ResultSettleSeconds" in UltraTorkWebConfig.json). Auto-increment ids are taken when a transaction
+# inserts but become visible when it commits, so with several writers a lower id can appear after a
+# higher one; SQLite has one writer at a time and commits its ids in order.
+RESULT_SETTLE_SECONDS = 5.0
+
+# Defaults of the result cache ("ResultCacheEntries", "ResultCacheMaxBytes" and "ResultCacheTtl" in
+# UltraTorkWebConfig.json; "ResultCache": false disables it)
+RESULT_CACHE_ENTRIES = 256
+RESULT_CACHE_MAX_BYTES = 64 * 1024 * 1024
+RESULT_CACHE_TTL = 300.0
+
+# Counters of the result cache exported on /metrics: stats() key -> (metric, type, help)
+RESULT_CACHE_METRICS = {
+    "hits": ("ultratork_result_cache_hits_total", "counter", "Result queries answered from the cache."),
+    "misses": ("ultratork_result_cache_misses_total", "counter", "Result queries that went to the database."),
+    "evictions": ("ultratork_result_cache_evictions_total", "counter",
+                  "Cache entries dropped to stay within the size limits."),
+    "invalidations": ("ultratork_result_cache_invalidations_total", "counter",
+                      "Cache entries dropped because results were added or the entry expired."),
+    "entries": ("ultratork_result_cache_entries", "gauge", "Entries in the result cache."),
+    "bytes": ("ultratork_result_cache_bytes", "gauge", "Estimated size of the result cache in bytes."),
+}
+
+# Layout of the UltraTork result table. Every entry can be overridden with the
+# "ResultTable" section of UltraTorkWebConfig.json if the installed schema differs.
+RESULT_TABLE = {
+    "Table": "TcResult",
+    "Id": "Id",
+    "TpName": "TpName",
+    "RunStart": "RunStart",
+    "TcName": "TcName",
+    "SwVersion": "SwVersion",
+    "Start": "Start",
+    "End": "End",
+    "Runtime": "Runtime",
+    "Result": "Result",
+    "Try": "Try",
+}
+
+# Index serving the testplace + run date range predicate of the result queries, and the one
+# the result cache reads the newest result id of a testplace from
+RESULT_INDEX = "TcResultTpRunStart"
+RESULT_ID_INDEX = "TcResultTpId"
+
+# Daily rollup of the result table and the watermark of the last folded result
+ROLLUP_TABLE = "TcResultDaily"
+WATERMARK_TABLE = "TcResultRollupMark"
+WATERMARK_NAME = "daily"
+
+# Rollup pyramid, finest level first: table, bucket column, watermark name and the approximate
+# bucket length in seconds. Bucket keys are the bucket start, "YYYY-MM-DD HH:00" for hours and
+# "YYYY-MM-DD" (Monday of the week, first of the month) for the others.
+ROLLUP_LEVELS = {
+    "hour": {"Table": "TcResultHourly", "Column": "RunHour", "Watermark": "hourly", "Seconds": 3600},
+    "day": {"Table": ROLLUP_TABLE, "Column": "RunDay", "Watermark": WATERMARK_NAME, "Seconds": 86400},
+    "week": {"Table": "TcResultWeekly", "Column": "RunWeek", "Watermark": "weekly", "Seconds": 604800},
+    "month": {"Table": "TcResultMonthly", "Column": "RunMonth", "Watermark": "monthly", "Seconds": 2629746},
+}
+
+RUN_TIME_FORMAT = "%Y-%m-%d %H:%M:%S,%f"
+
+# Operators accepted in queryResultPage() filters
+FILTER_OPERATORS = ("=", "!=", "<", "<=", ">", ">=", "contains", "startswith")
+
+
+def run_label(value):
+    """Run timestamp as "%Y-%m-%d %H:%M:%S,%f" string, whatever type the driver returned."""
+    if isinstance(value, datetime):
+        return value.strftime(RUN_TIME_FORMAT)
+    return str(value)
+
+
+def day_after(date_str):
+    """"YYYY-MM-DD" of the day following date_str."""
+    return (date.fromisoformat(date_str[:10]) + timedelta(days=1)).isoformat()
+
+
+def rollup_bucket(Level, RunStart):
+    """Key of the rollup bucket of the given level that contains a "YYYY-MM-DD[ HH...]" timestamp."""
+    if Level == "hour":
+        return RunStart[:13] + ":00"
+    if Level == "week":
+        day = date.fromisoformat(RunStart[:10])
+        return (day - timedelta(days=day.weekday())).isoformat()
+    if Level == "month":
+        return RunStart[:7] + "-01"
+    return RunStart[:10]
+
+
+def filter_key(StartDate, EndDate, ResultTypes):
+    """Hashable cache key part of a result filter."""
+    return StartDate, EndDate, tuple(ResultTypes) if ResultTypes is not None else None
+
+
+class UltraTorkWebResultDb:
+    """Direct query access to the UltraTork result database.
+
+    Shared like UltraTorkWebGuiIf: every instance sees the parameter list
+    that main.py hands over with setParameterList(). Queries take all their
+    filters as arguments and keep no per-call state, so they are safe to use
+    from concurrent callbacks.
+    """
+
+    _ParameterList = None
+    _Table = dict(RESULT_TABLE)
+    _Idle = queue.LifoQueue(maxsize=DB_CONNECTIONS)
+    _Inherited = None
+    _Pool = None
+    _PoolLock = threading.Lock()
+    _RollupLock = threading.Lock()
+    _RollupReady = False
+    _Cache = None
+    # (time first seen, id) of the newest result ids this process has seen, oldest first
+    _Seen = deque()
+    _SeenLock = threading.Lock()
+
+    def setParameterList(self, ParameterList):
+        UltraTorkWebResultDb._ParameterList = ParameterList
+        UltraTorkWebResultDb._Table = dict(RESULT_TABLE, **ParameterList.get("ResultTable", {}))
+        UltraTorkWebResultDb._Idle = queue.LifoQueue(maxsize=max(1, int(ParameterList.get("DBConnections",
+                                                                                        DB_CONNECTIONS))))
+        UltraTorkWebResultDb._RollupReady = False
+        UltraTorkWebResultDb._Cache = None
+        UltraTorkWebResultDb._Seen = deque()
+        if ParameterList.get("ResultCache", True):
+            UltraTorkWebResultDb._Cache = ResultCache(
+                MaxEntries=int(ParameterList.get("ResultCacheEntries", RESULT_CACHE_ENTRIES)),
+                MaxBytes=int(ParameterList.get("ResultCacheMaxBytes", RESULT_CACHE_MAX_BYTES)),
+                Ttl=float(ParameterList.get("ResultCacheTtl", RESULT_CACHE_TTL)))
+        with self._PoolLock:
+            if UltraTorkWebResultDb._Pool is not None:
+                UltraTorkWebResultDb._Pool.shutdown(wait=False)
+            UltraTorkWebResultDb._Pool = None
+
+    def _pool(self):
+        with self._PoolLock:
+            if UltraTorkWebResultDb._Pool is None:
+                workers = int(self._ParameterList.get("QueryWorkers", QUERY_WORKERS))
+                UltraTorkWebResultDb._Pool = ThreadPoolExecutor(max_workers=max(1, workers),
+                                                                thread_name_prefix="ResultDb")
+            return UltraTorkWebResultDb._Pool
+
+    def mapTestplaces(self, func, TpNames, Progress=None):
+        """Run func(TpName) for every testplace on the query pool.
+
+        Returns the results in TpNames order and logs the time spent per testplace.
+        Progress(done, total, TpName) is called as each testplace finishes.
+        """
+        def logged(TpName):
+            begin = time.perf_counter()
+            try:
+                return func(TpName)
+            finally:
+                logger.info("%s(%s) took %.1f ms", func.__name__, TpName, (time.perf_counter() - begin) * 1000)
+
+        # The pool threads run in a copy of the caller's context, so their metrics count for its callback
+        futures = {self._pool().submit(contextvars.copy_context().run, logged, TpName): TpName for TpName in TpNames}
+        if Progress is not None:
+            for done, future in enumerate(as_completed(futures), 1):
+                Progress(done, len(futures), futures[future])
+        return [future.result() for future in futures]
+
+    @classmethod
+    def _afterFork(cls):
+        # A forked process (e.g. a background callback job) inherits neither the pool threads nor
+        # usable connections, and locks may have been held by threads that do not exist there. The parent's
+        # connections stay referenced, so the child never closes sockets the parent still uses.
+        cls._Inherited = cls._Idle
+        cls._Idle = queue.LifoQueue(maxsize=cls._Idle.maxsize)
+        cls._Pool = None
+        cls._PoolLock = threading.Lock()
+        cls._RollupLock = threading.Lock()
+        cls._SeenLock = threading.Lock()
+        # What a job would put into the result cache is lost when it ends, so jobs query the database;
+        # their queries read the rollup and stay cheap
+        cls._Cache = None
+
+    def getDbType(self):
+        if self._ParameterList is None:
+            raise RuntimeError("UltraTorkWebResultDb: no parameter list set")
+        return self._ParameterList["DBType"]
+
+    def _placeholder(self):
+        return "%s" if self.getDbType() == "MySQL" else "?"
+
+    def _connect(self):
+        para = self._ParameterList
+        if self.getDbType() == "MySQL":
+            import mysql.connector
+            conn = mysql.connector.connect(host=para["DBHost"],
+                                           user=para["DBUserName"],
+                                           password=para["DBPassword"],
+                                           database=para.get("DBName", "UltraTork"),
+                                           # Without it every read after the first sees the snapshot of
+                                           # an open REPEATABLE READ transaction and misses new results
+                                           autocommit=True)
+        else:
+            # Connections move between threads through the pool, but only one thread uses them at a time
+            conn = sqlite3.connect(para.get("DBPath") or para["DBHost"], check_same_thread=False)
+        return conn
+
+    @contextlib.contextmanager
+    def _connection(self):
+        """Lend an idle connection of the pool, or a new one; it is returned or closed afterwards.
+
+        Web requests run on short-lived threads, so connections are not bound to threads.
+        A connection whose use raised is closed, its state is unknown.
+        """
+        try:
+            conn = self._Idle.get_nowait()
+        except queue.Empty:
+            conn = self._connect()
+        try:
+            yield conn
+        except BaseException:
+            self._close(conn)
+            raise
+        try:
+            self._Idle.put_nowait(conn)
+        except queue.Full:
+            self._close(conn)
+
+    def _close(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            logger.debug("Closing a database connection failed", exc_info=True)
+
+    def startSchemaSetup(self):
+        """Run setupSchema() on a thread of its own and return the thread; main.py starts it at startup.
+
+        Building an index on a large result table can take minutes, and the app accepts
+        requests meanwhile: until the rollup tables are ready the counts are read from the
+        result table, as without them.
+        """
+        def setup():
+            begin = time.perf_counter()
+            self.setupSchema()
+            logger.info("Schema setup took %.0f ms", (time.perf_counter() - begin) * 1000)
+        thread = threading.Thread(target=setup, name="ResultDbSchema", daemon=True)
+        thread.start()
+        return thread
+
+    def setupSchema(self):
+        """Create the result indexes and the rollup tables.
+
+        Failures (e.g. a read-only account or a lock timeout while building the
+        index on a large table) are logged and not raised: the queries then run
+        without the index, and without the rollup tables the counts are read
+        from the result table.
+        """
+        try:
+            with self._connection() as conn:
+                self._createIndex(conn)
+        except Exception:
+            logger.warning("Creating the result indexes %s and %s failed, the result queries run without them",
+                           RESULT_INDEX, RESULT_ID_INDEX, exc_info=True)
+
+        try:
+            with self._connection() as conn:
+                self._createRollup(conn)
+            ready = True
+        except Exception:
+            ready = self._rollupExists()
+            logger.warning("Creating the rollup tables failed, %s", "using the existing ones" if ready
+                           else "the counts are read from the result table", exc_info=True)
+        UltraTorkWebResultDb._RollupReady = ready
+
+    def _rollupExists(self):
+        try:
+            for level in ROLLUP_LEVELS.values():
+                self._execute("SELECT 1 FROM {} LIMIT 1".format(level["Table"]))
+            marks = self._execute("SELECT COUNT(*) FROM {}".format(WATERMARK_TABLE))[0][0]
+        except Exception:
+            return False
+        return int(marks) >= len(ROLLUP_LEVELS)
+
+    def _createIndex(self, conn):
+        # (testplace, run start, result) turns the filters of the result queries into an
+        # index range scan and covers the per-result counts; (testplace, id) makes the newest
+        # result of a testplace in getChangeToken() a single index lookup
+        if not self._ParameterList.get("CreateResultIndex", True):
+            return
+
+        t = self._Table
+        indexes = {RESULT_INDEX: (t["TpName"], t["RunStart"], t["Result"]), RESULT_ID_INDEX: (t["TpName"], t["Id"])}
+        cursor = conn.cursor()
+        try:
+            for name, columns in indexes.items():
+                if self.getDbType() == "MySQL":
+                    cursor.execute("SELECT COUNT(*) FROM information_schema.statistics "
+                                   "WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s",
+                                   (t["Table"], name))
+                    if cursor.fetchall()[0][0] == 0:
+                        cursor.execute("CREATE INDEX {} ON {} ({})".format(name, t["Table"], ", ".join(columns)))
+                else:
+                    cursor.execute("CREATE INDEX IF NOT EXISTS {} ON {} ({})".format(name, t["Table"],
+                                                                                     ", ".join(columns)))
+            conn.commit()
+        finally:
+            cursor.close()
+
+    @timed("database")
+    def _execute(self, sql, args=()):
+        with self._connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(sql, args)
+                return cursor.fetchall()
+            finally:
+                cursor.close()
+
+    def _inList(self, values):
+        return "(" + ", ".join([self._placeholder()] * len(values)) + ")"
+
+    def getChangeToken(self, TpNames, Settled=None):
+        """Newest result id of every testplace, up to the settled id and up to each rollup watermark.
+
+        Changes when results of these testplaces settle or are folded, and only then: results
+        of other testplaces leave the token, and so the cached queries of these, unchanged.
+        Every part is one lookup in the (testplace, id) index, so the token is read for every
+        cached query. Settled is the settled id to read it at, by default the current one.
+        Removed results are only noticed when the entries expire ("ResultCacheTtl").
+        """
+        if not TpNames:
+            return ()
+        # The parts are named by their bound, not its value: the bounds move with the results of all
+        # testplaces. Bounds of the same value (usually all watermarks) are looked up once.
+        bounds = {"settled": self.getSettledResultId() if Settled is None else int(Settled)}
+        if self._RollupReady:
+            bounds.update((name, int(last_id)) for name, last_id
+                          in self._execute("SELECT Name, LastId FROM {}".format(WATERMARK_TABLE)))
+        values = sorted(set(bounds.values()))
+
+        t = self._Table
+        p = self._placeholder()
+        sql = " UNION ALL ".join(["SELECT {p}, {p}, MAX({id}) FROM {table} WHERE {tp} = {p} AND {id} <= {p}".format(
+            id=t["Id"], table=t["Table"], tp=t["TpName"], p=p)] * (len(TpNames) * len(values)))
+        args = []
+        for TpName in TpNames:
+            for value in values:
+                args.extend((TpName, value, TpName, value))
+        last_ids = {(tp_name, int(value)): int(last_id or 0) for tp_name, value, last_id in self._execute(sql, args)}
+        return tuple(sorted((TpName, name, last_ids[(TpName, value)])
+                            for TpName in TpNames for name, value in bounds.items()))
+
+    def _cached(self, Query, TpNames, Args, Compute, Settled=None):
+        # Results are cached per (query, testplaces, filter) and dropped as soon as results of the
+        # testplaces were added. A value counted up to a settled id must pass that id as Settled.
+        # The cache lives in the web process; background jobs have none (see _afterFork()).
+        # Cached values are shared, callers must not modify them.
+        cache = self._Cache
+        if cache is None:
+            return Compute()
+
+        key = (Query, tuple(TpNames), Args)
+        token = self.getChangeToken(TpNames, Settled)
+        found, value = cache.get(key, token)
+        if not found:
+            value = Compute()
+            cache.put(key, token, value)
+        return value
+
+    def getCacheStats(self):
+        """Hit/miss/eviction counters and size of the result cache."""
+        return self._Cache.stats() if self._Cache is not None else {}
+
+    def getCacheMetrics(self):
+        """Cache counters as (metric, type, help, value) samples for UltraTorkWebMetrics.addCollector()."""
+        stats = self.getCacheStats()
+        return [spec + (stats[key],) for key, spec in RESULT_CACHE_METRICS.items() if key in stats]
+
+    def _createRollup(self, conn):
+        if self.getDbType() == "MySQL":
+            text, ignore = "VARCHAR(255)", "INSERT IGNORE"
+        else:
+            text, ignore = "TEXT", "INSERT OR IGNORE"
+
+        # Every level has its own watermark, so a level added later is filled from the start
+        cursor = conn.cursor()
+        cursor.execute("CREATE TABLE IF NOT EXISTS {} (Name VARCHAR(32) NOT NULL PRIMARY KEY, "
+                       "LastId BIGINT NOT NULL, LastRunStart {t} NOT NULL)".format(WATERMARK_TABLE, t=text))
+        for level in ROLLUP_LEVELS.values():
+            cursor.execute("CREATE TABLE IF NOT EXISTS {} (TpName {t} NOT NULL, {} CHAR(16) NOT NULL, "
+                           "Result {t} NOT NULL, ResultCount BIGINT NOT NULL, RuntimeSum DOUBLE NOT NULL, "
+                           "PRIMARY KEY (TpName, {}, Result))".format(level["Table"], level["Column"],
+                                                                      level["Column"], t=text))
+            cursor.execute("{} INTO {} (Name, LastId, LastRunStart) VALUES ({p}, 0, '')".format(
+                ignore, WATERMARK_TABLE, p=self._placeholder()), (level["Watermark"],))
+        cursor.close()
+        conn.commit()
+
+    def getRollupWatermark(self, Level="day"):
+        """Return (last folded result id, its run timestamp) of a rollup level.
+
+        Without the rollup tables the counts are read live, up to the newest result.
+        """
+        if not self._RollupReady:
+            return self.getSettledResultId(), ""
+        rows = self._execute("SELECT LastId, LastRunStart FROM {} WHERE Name = {}".format(
+            WATERMARK_TABLE, self._placeholder()), (ROLLUP_LEVELS[Level]["Watermark"],))
+        return (int(rows[0][0]), rows[0][1]) if rows else (0, "")
+
+    def updateRollup(self):
+        """Fold results newer than the watermarks into the rollup tables of all levels.
+
+        Returns the number of folded results. Safe to call on every request:
+        without new results it costs one indexed lookup per level. A failure is
+        logged; the rollup then stays at its watermark until the next call.
+        """
+        if not self._RollupReady:
+            return 0
+        try:
+            return self._updateRollup()
+        except Exception:
+            logger.warning("Updating the rollup failed, its counts stay at the watermark", exc_info=True)
+            return 0
+
+    def _updateRollup(self):
+        t = self._Table
+        with self._RollupLock, self._connection() as conn:
+            # Results above the settled id may still miss lower ids that commit later
+            upper_id = self.getSettledResultId()
+            if not upper_id:
+                return 0
+
+            # Results are grouped per hour once per distinct watermark; coarser levels fold the hours
+            sql = ("SELECT {tp}, SUBSTR({run}, 1, 13), {res}, COUNT(*), SUM({rt}), MAX({run}) FROM {table} "
+                   "WHERE {id} > {p} AND {id} <= {p} "
+                   "GROUP BY {tp}, SUBSTR({run}, 1, 13), {res}").format(
+                tp=t["TpName"], run=t["RunStart"], res=t["Result"], rt=t["Runtime"], id=t["Id"],
+                table=t["Table"], p=self._placeholder())
+            hours = {}
+            folded = 0
+            for name in ROLLUP_LEVELS:
+                last_id, _ = self.getRollupWatermark(name)
+                if int(upper_id) <= last_id:
+                    continue
+                if last_id not in hours:
+                    hours[last_id] = self._execute(sql, (last_id, upper_id))
+                folded = max(folded, self._foldRollup(conn, name, hours[last_id], last_id, upper_id))
+
+        if folded:
+            logger.info("updateRollup folded %d results up to id %s", folded, upper_id)
+        return folded
+
+    def _foldRollup(self, conn, Level, Groups, LastId, UpperId):
+        level = ROLLUP_LEVELS[Level]
+        p = self._placeholder()
+
+        buckets = {}
+        last_run = ""
+        for tp_name, hour, result_type, count, runtime_sum, max_run in Groups:
+            bucket = buckets.setdefault((tp_name, rollup_bucket(Level, str(hour)), result_type), [0, 0.0])
+            bucket[0] += int(count)
+            bucket[1] += float(runtime_sum or 0)
+            last_run = max(last_run, run_label(max_run))
+
+        if self.getDbType() == "MySQL":
+            upsert = ("INSERT INTO {table} (TpName, {col}, Result, ResultCount, RuntimeSum) "
+                      "VALUES ({p}, {p}, {p}, {p}, {p}) "
+                      "ON DUPLICATE KEY UPDATE ResultCount = ResultCount + VALUES(ResultCount), "
+                      "RuntimeSum = RuntimeSum + VALUES(RuntimeSum)")
+        else:
+            upsert = ("INSERT INTO {table} (TpName, {col}, Result, ResultCount, RuntimeSum) "
+                      "VALUES ({p}, {p}, {p}, {p}, {p}) "
+                      "ON CONFLICT (TpName, {col}, Result) DO UPDATE SET "
+                      "ResultCount = ResultCount + excluded.ResultCount, "
+                      "RuntimeSum = RuntimeSum + excluded.RuntimeSum")
+        upsert = upsert.format(table=level["Table"], col=level["Column"], p=p)
+
+        if self.getDbType() == "MySQL":
+            # MySQL connections autocommit; the watermark and the counts must change together
+            conn.start_transaction()
+        cursor = conn.cursor()
+        try:
+            # Move the watermark first; if another process got there before us, leave it to them
+            cursor.execute("UPDATE {} SET LastId = {p} WHERE Name = {p} AND LastId = {p}".format(
+                WATERMARK_TABLE, p=p), (UpperId, level["Watermark"], LastId))
+            if cursor.rowcount != 1:
+                conn.rollback()
+                return 0
+
+            cursor.executemany(upsert, [(tp_name, bucket, result_type, count, runtime_sum)
+                                        for (tp_name, bucket, result_type), (count, runtime_sum)
+                                        in buckets.items()])
+
+            cursor.execute("UPDATE {} SET LastRunStart = {p} WHERE Name = {p}".format(WATERMARK_TABLE, p=p),
+                           (last_run, level["Watermark"]))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.close()
+
+        return sum(count for count, _ in buckets.values())
+
+    def getDailyResultCounts(self, TpNames):
+        """Return (date, testplace, result type, count) tuples for the given testplaces from the daily rollup."""
+        return self._cached("getDailyResultCounts", TpNames, (),
+                            lambda: self._getDailyResultCounts(TpNames))
+
+    def _getDailyResultCounts(self, TpNames):
+        return self._getBucketResultCounts("day", TpNames)
+
+    def getDailyResultCountsByTp(self, TpNames, Progress=None):
+        """Like getDailyResultCounts(), but with one query per testplace running concurrently.
+
+        Returns (rows, cursor): cursor maps every testplace to the id of the last result its
+        rows include: the rollup rows and their watermark come from the same statement,
+        the result table is counted up to the settled id. The results with a larger id are
+        exactly the ones the rows miss. Progress is passed on to mapTestplaces().
+        """
+        def ofTp(TpName):
+            if not self._RollupReady:
+                settled = self.getSettledResultId()
+                return self._cached("getRawDailyResultCounts", [TpName], (),
+                                    lambda: self._getRawDailyResultCounts(TpName, settled), Settled=settled), settled
+            return self._cached("getDailyResultCountsWithId", [TpName], (),
+                                lambda: self._getDailyResultCountsWithId(TpName))
+        ofTp.__name__ = "getDailyResultCounts"
+
+        rows = []
+        cursor = {}
+        for TpName, (TpRows, last_id) in zip(TpNames, self.mapTestplaces(ofTp, TpNames, Progress)):
+            rows.extend(TpRows)
+            cursor[TpName] = last_id
+        return rows, cursor
+
+    def _getDailyResultCountsWithId(self, TpName):
+        # One statement reads one snapshot: the rollup rows with its watermark
+        sql = ("SELECT RunDay, TpName, Result, ResultCount FROM {} WHERE TpName = {p} "
+               "UNION ALL SELECT NULL, NULL, NULL, LastId FROM {} WHERE Name = {p} "
+               "ORDER BY 1, 2").format(ROLLUP_TABLE, WATERMARK_TABLE, p=self._placeholder())
+        rows = []
+        last_id = 0
+        for day, tp_name, result_type, count in self._execute(sql, (TpName, WATERMARK_NAME)):
+            if tp_name is None:
+                last_id = int(count or 0)
+            else:
+                rows.append((str(day), tp_name, result_type, int(count)))
+        return rows, last_id
+
+    def _getRawDailyResultCounts(self, TpName, UpTo):
+        # Without the rollup the result table is counted up to a settled id
+        t = self._Table
+        sql = ("SELECT SUBSTR({run}, 1, 10), {tp}, {res}, COUNT(*) FROM {table} WHERE {tp} = {p} AND {id} <= {p} "
+               "GROUP BY SUBSTR({run}, 1, 10), {tp}, {res} ORDER BY 1").format(
+            run=t["RunStart"], tp=t["TpName"], res=t["Result"], id=t["Id"], table=t["Table"], p=self._placeholder())
+        return [(str(day), tp_name, result_type, int(count))
+                for day, tp_name, result_type, count in self._execute(sql, (TpName, int(UpTo)))]
+
+    def getBucketResultCounts(self, Level, TpNames, Start=None, End=None):
+        """Return (bucket, testplace, result type, count) tuples from the rollup of the given level.
+
+        Start and End are inclusive "YYYY-MM-DD[ HH:MM...]" bounds on the bucket key;
+        pass rollup_bucket(Level, ...) as Start to include the bucket a range starts in.
+        """
+        return self._cached("getBucketResultCounts", TpNames, (Level, Start, End),
+                            lambda: self._getBucketResultCounts(Level, TpNames, Start, End))
+
+    def _getBucketResultCounts(self, Level, TpNames, Start=None, End=None):
+        if not TpNames:
+            return []
+        if not self._RollupReady:
+            return self._getRawBucketResultCounts(Level, TpNames, Start, End)
+
+        level = ROLLUP_LEVELS[Level]
+        p = self._placeholder()
+        sql = "SELECT {col}, TpName, Result, ResultCount FROM {} WHERE TpName IN {}"
+        args = list(TpNames)
+        if Start:
+            sql += " AND {col} >= " + p
+            args.append(Start)
+        if End:
+            sql += " AND {col} <= " + p
+            args.append(End)
+        sql = (sql + " ORDER BY {col}, TpName").format(level["Table"], self._inList(TpNames), col=level["Column"])
+        return [(str(row[0]), row[1], row[2], int(row[3])) for row in self._execute(sql, args)]
+
+    def _getRawBucketResultCounts(self, Level, TpNames, Start=None, End=None):
+        # Without the rollup tables the buckets are counted from the result table: per hour or day
+        # in the database, weeks and months are folded from the days here
+        t = self._Table
+        width = 13 if Level == "hour" else 10
+        where = ["{} IN {}".format(t["TpName"], self._inList(TpNames))]
+        args = list(TpNames)
+        if Start:
+            where.append("{} >= {}".format(t["RunStart"], self._placeholder()))
+            args.append(Start)
+        sql = ("SELECT SUBSTR({run}, 1, {w}), {tp}, {res}, COUNT(*) FROM {table} WHERE {where} "
+               "GROUP BY SUBSTR({run}, 1, {w}), {tp}, {res}").format(
+            run=t["RunStart"], w=width, tp=t["TpName"], res=t["Result"], table=t["Table"], where=" AND ".join(where))
+
+        buckets = {}
+        for key, tp_name, result_type, count in self._execute(sql, args):
+            bucket = rollup_bucket(Level, str(key))
+            if not End or bucket <= End:
+                buckets[(bucket, tp_name, result_type)] = buckets.get((bucket, tp_name, result_type), 0) + int(count)
+        return [key + (count,) for key, count in sorted(buckets.items())]
+
+    def getBucketResultCountsByTp(self, Level, TpNames, Start=None, End=None, Progress=None):
+        """Like getBucketResultCounts(), but with one query per testplace running concurrently."""
+        def ofTp(TpName):
+            return self.getBucketResultCounts(Level, [TpName], Start, End)
+        ofTp.__name__ = "getBucketResultCounts_" + Level
+
+        rows = []
+        for TpRows in self.mapTestplaces(ofTp, TpNames, Progress):
+            rows.extend(TpRows)
+        return rows
+
+    def getLastResultId(self):
+        """Id of the newest result, 0 for an empty result table."""
+        t = self._Table
+        last_id = self._execute("SELECT MAX({}) FROM {}".format(t["Id"], t["Table"]))[0][0]
+        return int(last_id or 0)
+
+    def getSettledResultId(self):
+        """Id up to which all results are committed; cursors over result ids must not move past it.
+
+        With several writers a transaction can commit a lower id after a higher one was
+        visible. An id seen for the first time at least "ResultSettleSeconds" ago is taken
+        as settled: the transactions that took the ids below it have committed by then.
+        Until the first id this process saw has settled, the rollup watermarks are the
+        bound (they were moved to settled ids only); without rollup tables the call waits.
+        """
+        last_id = self.getLastResultId()
+        settle = float(self._ParameterList.get("ResultSettleSeconds",
+                                               RESULT_SETTLE_SECONDS if self.getDbType() == "MySQL" else 0))
+        if settle <= 0:
+            return last_id
+
+        now = time.monotonic()
+        with self._SeenLock:
+            seen = self._Seen
+            if not seen or last_id > seen[-1][1]:
+                seen.append((now, last_id))
+            # Only the newest settled id is kept of the ones seen more than settle seconds ago
+            while len(seen) > 1 and seen[1][0] <= now - settle:
+                seen.popleft()
+            first_seen, settled = seen[0]
+        if first_seen <= now - settle:
+            return settled
+
+        try:
+            # Also while the schema setup runs, the watermarks of an earlier start are settled ids
+            marks = self._execute("SELECT MIN(LastId) FROM {}".format(WATERMARK_TABLE))[0][0]
+        except Exception:
+            marks = None
+        if marks is not None:
+            return min(int(marks), settled)
+        time.sleep(first_seen + settle - now)
+        return settled
+
+    def getResultCountsSince(self, Cursor, UpTo=None):
+        """Count the results added after a cursor of result ids.
+
+        Cursor maps testplace -> last seen result id. Returns (rows, cursor): rows are
+        (testplace, hour "YYYY-MM-DD HH:00", result type, count) tuples of the results with a
+        larger id, cursor is moved past them. Only ids up to UpTo (by default the settled id)
+        are counted and every testplace of the cursor is moved to it. The query is a range scan over the result ids,
+        so its cost follows the number of new results and not the size of the history.
+        """
+        if not Cursor:
+            return [], {}
+
+        t = self._Table
+        p = self._placeholder()
+        args = [min(int(LastId) for LastId in Cursor.values())]
+        for TpName, LastId in Cursor.items():
+            args.extend((TpName, int(LastId)))
+        if UpTo is None:
+            UpTo = self.getSettledResultId()
+        cond = " OR ".join(["({} = {p} AND {} > {p})".format(t["TpName"], t["Id"], p=p)] * len(Cursor))
+        cond = "({}) AND {} <= {}".format(cond, t["Id"], p)
+        args.append(int(UpTo))
+        sql = ("SELECT {tp}, SUBSTR({run}, 1, 13), {res}, COUNT(*), MAX({id}) FROM {table} "
+               "WHERE {id} > {p} AND ({cond}) "
+               "GROUP BY {tp}, SUBSTR({run}, 1, 13), {res}").format(
+            tp=t["TpName"], run=t["RunStart"], res=t["Result"], id=t["Id"], table=t["Table"], p=p, cond=cond)
+
+        rows = []
+        cursor = {TpName: max(int(LastId), int(UpTo)) for TpName, LastId in Cursor.items()}
+        for tp_name, hour, result_type, count, max_id in self._execute(sql, args):
+            rows.append((tp_name, rollup_bucket("hour", str(hour)), result_type, int(count)))
+            cursor[tp_name] = max(cursor[tp_name], int(max_id))
+        return rows, cursor
+
+    def getResultCountsBetween(self, FromId, ToId):
+        """Count the results of all testplaces with FromId < id <= ToId.
+
+        Returns (testplace, hour "YYYY-MM-DD HH:00", result type, count) tuples like
+        getResultCountsSince(); this is the query of the result stream's watcher.
+        """
+        t = self._Table
+        p = self._placeholder()
+        sql = ("SELECT {tp}, SUBSTR({run}, 1, 13), {res}, COUNT(*) FROM {table} "
+               "WHERE {id} > {p} AND {id} <= {p} "
+               "GROUP BY {tp}, SUBSTR({run}, 1, 13), {res}").format(
+            tp=t["TpName"], run=t["RunStart"], res=t["Result"], id=t["Id"], table=t["Table"], p=p)
+        return [(tp_name, rollup_bucket("hour", str(hour)), result_type, int(count))
+                for tp_name, hour, result_type, count in self._execute(sql, (int(FromId), int(ToId)))]
+
+    def getRollupRange(self, TpNames):
+        """Return the first and last day ("YYYY-MM-DD") with results of the testplaces, or (None, None)."""
+        if not TpNames:
+            return None, None
+
+        if self._RollupReady:
+            sql = "SELECT MIN(RunDay), MAX(RunDay) FROM {} WHERE TpName IN {}".format(ROLLUP_TABLE,
+                                                                                      self._inList(TpNames))
+        else:
+            t = self._Table
+            sql = "SELECT MIN(SUBSTR({run}, 1, 10)), MAX(SUBSTR({run}, 1, 10)) FROM {} WHERE {} IN {}".format(
+                t["Table"], t["TpName"], self._inList(TpNames), run=t["RunStart"])
+        first, last = self._execute(sql, list(TpNames))[0]
+        return (str(first), str(last)) if first is not None else (None, None)
+
+    def _where(self, TpNames, StartDate=None, EndDate=None, ResultTypes=None, Filters=()):
+        """Build the WHERE clause and its arguments shared by the result queries.
+
+        Filters are (field, operator, value) tuples with a RESULT_TABLE field name and
+        one of FILTER_OPERATORS.
+        """
+        t = self._Table
+        p = self._placeholder()
+        where = ["{} IN {}".format(t["TpName"], self._inList(TpNames))]
+        args = list(TpNames)
+        if StartDate:
+            where.append("{} >= {}".format(t["RunStart"], p))
+            args.append(StartDate[:10])
+        if EndDate:
+            where.append("{} < {}".format(t["RunStart"], p))
+            args.append(day_after(EndDate))
+        if ResultTypes is not None:
+            if ResultTypes:
+                where.append("{} IN {}".format(t["Result"], self._inList(ResultTypes)))
+                args.extend(ResultTypes)
+            else:
+                where.append("1 = 0")
+
+        for field, operator, value in Filters:
+            if field not in RESULT_TABLE or field == "Table" or operator not in FILTER_OPERATORS:
+                raise ValueError("Unsupported filter: {} {} {}".format(field, operator, value))
+            if operator in ("contains", "startswith"):
+                escaped = str(value).replace("!", "!!").replace("%", "!%").replace("_", "!_")
+                pattern = ("%" if operator == "contains" else "") + escaped + "%"
+                where.append("{} LIKE {} ESCAPE '!'".format(t[field], p))
+                args.append(pattern)
+            else:
+                where.append("{} {} {}".format(t[field], operator, p))
+                args.append(value)
+
+        return " AND ".join(where), args
+
+    def countResults(self, TpNames, StartDate=None, EndDate=None, ResultTypes=None):
+        """Return {result type: count} of the results matching the filter."""
+        return self._cached("countResults", TpNames, filter_key(StartDate, EndDate, ResultTypes),
+                            lambda: self._countResults(TpNames, StartDate, EndDate, ResultTypes))
+
+    def _countResults(self, TpNames, StartDate=None, EndDate=None, ResultTypes=None, UpTo=None):
+        if not TpNames:
+            return {}
+
+        t = self._Table
+        where, args = self._where(TpNames, StartDate, EndDate, ResultTypes)
+        if UpTo is not None:
+            where += " AND {} <= {}".format(t["Id"], self._placeholder())
+            args.append(int(UpTo))
+        sql = "SELECT {res}, COUNT(*) FROM {table} WHERE {where} GROUP BY {res}".format(
+            res=t["Result"], table=t["Table"], where=where)
+        return {row[0]: int(row[1]) for row in self._execute(sql, args)}
+
+    def countResultsWithId(self, TpNames, StartDate=None, EndDate=None, ResultTypes=None):
+        """Return ({result type: count}, result id) like countResults(), counting the results up to the id.
+
+        The id is the settled one (see getSettledResultId()), so the result stream's events
+        after it can be added to the counts.
+        """
+        settled = self.getSettledResultId()
+        counts = self._cached("countResultsUpTo", TpNames, filter_key(StartDate, EndDate, ResultTypes),
+                              lambda: self._countResults(TpNames, StartDate, EndDate, ResultTypes, settled),
+                              Settled=settled)
+        return counts, settled
+
+    def _resultColumns(self):
+        t = self._Table
+        return ", ".join(t[c] for c in ("Id", "TpName", "RunStart", "TcName", "SwVersion",
+                                        "Start", "End", "Runtime", "Result", "Try"))
+
+    def getResult(self, ResultId):
+        """Return the flat result (see queryResultPage()) with the given id, or None."""
+        t = self._Table
+        sql = "SELECT {} FROM {} WHERE {} = {}".format(self._resultColumns(), t["Table"], t["Id"], self._placeholder())
+        rows = self._execute(sql, (ResultId,))
+        if not rows:
+            return None
+        row = rows[0]
+        return [row[0], row[1]] + list(row[3:]) + [run_label(row[2])]
+
+    def queryResultPage(self, TpNames, StartDate=None, EndDate=None, ResultTypes=None, Filters=(),
+                        SortBy=(), Offset=0, Limit=50):
+        """Return (results, total) for one page of the matching results.
+
+        Results are flat: [id, testplace, name, SW version, start, end, runtime, result type,
+        try, run timestamp]. SortBy is a list of (field, descending) tuples; total is the
+        number of matching results over all pages.
+        """
+        key = filter_key(StartDate, EndDate, ResultTypes) + (tuple(Filters), tuple(SortBy), Offset, Limit)
+        return self._cached("queryResultPage", TpNames, key,
+                            lambda: self._queryResultPage(TpNames, StartDate, EndDate, ResultTypes, Filters,
+                                                          SortBy, Offset, Limit))
+
+    def _queryResultPage(self, TpNames, StartDate=None, EndDate=None, ResultTypes=None, Filters=(),
+                         SortBy=(), Offset=0, Limit=50):
+        if not TpNames:
+            return [], 0
+
+        t = self._Table
+        where, args = self._where(TpNames, StartDate, EndDate, ResultTypes, Filters)
+
+        order = []
+        for field, descending in SortBy:
+            if field not in RESULT_TABLE or field == "Table":
+                raise ValueError("Unsupported sort field: {}".format(field))
+            order.append("{} {}".format(t[field], "DESC" if descending else "ASC"))
+        order += ["{} ASC".format(t["RunStart"]), "{} ASC".format(t["Id"])]
+
+        total = self._execute("SELECT COUNT(*) FROM {} WHERE {}".format(t["Table"], where), args)[0][0]
+        sql = "SELECT {} FROM {} WHERE {} ORDER BY {} LIMIT {} OFFSET {}".format(
+            self._resultColumns(), t["Table"], where, ", ".join(order), int(Limit), int(Offset))
+
+        results = [[row[0], row[1]] + list(row[3:]) + [run_label(row[2])] for row in self._execute(sql, args)]
+        return results, int(total)
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=UltraTorkWebResultDb._afterFork)
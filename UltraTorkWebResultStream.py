@@ -0,0 +1,155 @@
+import json
+import logging
+import os
+import queue
+import threading
+import time
+
+from UltraTorkWebResultDb import UltraTorkWebResultDb
+
+logger = logging.getLogger(__name__)
+
+# Defaults of the result stream ("AutoRefreshSeconds" and "ResultStreamQueue" in UltraTorkWebConfig.json)
+STREAM_POLL_SECONDS = 10.0
+STREAM_QUEUE_SIZE = 100
+
+# Comment lines keep idle connections open through proxies
+STREAM_HEARTBEAT_SECONDS = 15.0
+
+# URL of the event stream
+STREAM_ROUTE = "/events/results"
+
+
+def format_event(Event):
+    """A result event as a server-sent event of type "results"."""
+    return "event: results\ndata: {}\n\n".format(json.dumps(Event, separators=(",", ":")))
+
+
+class UltraTorkWebResultStream:
+    """Pushes new test results to all open pages over server-sent events.
+
+    Shared like UltraTorkWebConfigStore: main.py configures it and registers
+    the route once. One watcher thread per server process checks the settled
+    result id (see UltraTorkWebResultDb.getSettledResultId()) every
+    AutoRefreshSeconds and, when results were added, counts them once and puts
+    the event {"from": id, "to": id, "rows": [[testplace, hour, result type,
+    count], ...]} into the queue of every subscriber of its process. The watcher
+    only runs while pages are subscribed, so the database cost depends on the
+    number of server processes and not on the number of viewers. Every
+    subscriber holds a server thread, so pages only subscribe while they are
+    shown and use the events (assets/UltraTorkWebResultStream.js). A
+    subscriber that falls behind loses its oldest events; the pages detect the
+    gap from the ids and fetch the missing counts once.
+    """
+
+    _PollSeconds = STREAM_POLL_SECONDS
+    _QueueSize = STREAM_QUEUE_SIZE
+    _Subscribers = set()
+    _Lock = threading.Lock()
+    _Watcher = None
+    _LastId = None
+    _Events = 0
+
+    def setParameterList(self, ParameterList):
+        UltraTorkWebResultStream._PollSeconds = max(1.0, float(ParameterList.get("AutoRefreshSeconds",
+                                                                                 STREAM_POLL_SECONDS)))
+        UltraTorkWebResultStream._QueueSize = max(1, int(ParameterList.get("ResultStreamQueue", STREAM_QUEUE_SIZE)))
+
+    def subscribe(self):
+        """Queue that receives the result events from now on; starts the watcher if needed."""
+        events = queue.Queue(maxsize=self._QueueSize)
+        with self._Lock:
+            self._Subscribers.add(events)
+            if self._Watcher is None or not self._Watcher.is_alive():
+                UltraTorkWebResultStream._Watcher = threading.Thread(target=self._watch, name="ResultStream",
+                                                                     daemon=True)
+                UltraTorkWebResultStream._Watcher.start()
+        return events
+
+    def unsubscribe(self, Events):
+        with self._Lock:
+            self._Subscribers.discard(Events)
+
+    def _watch(self):
+        db = UltraTorkWebResultDb()
+        while True:
+            with self._Lock:
+                if not self._Subscribers:
+                    # The next subscriber starts a new watcher, which continues from the settled result
+                    UltraTorkWebResultStream._Watcher = None
+                    UltraTorkWebResultStream._LastId = None
+                    return
+            try:
+                # Events end at the settled id, so a result that commits late under a lower id is not skipped
+                last_id = db.getSettledResultId()
+                if self._LastId is None:
+                    UltraTorkWebResultStream._LastId = last_id
+                elif last_id > self._LastId:
+                    rows = db.getResultCountsBetween(self._LastId, last_id)
+                    self.publish({"from": self._LastId, "to": last_id, "rows": [list(row) for row in rows]})
+                    UltraTorkWebResultStream._LastId = last_id
+            except Exception:
+                logger.exception("Checking for new results failed")
+            time.sleep(self._PollSeconds)
+
+    def publish(self, Event):
+        """Put an event into the queue of every subscriber, dropping the oldest one of full queues."""
+        with self._Lock:
+            subscribers = list(self._Subscribers)
+            UltraTorkWebResultStream._Events += 1
+        for events in subscribers:
+            while True:
+                try:
+                    events.put_nowait(Event)
+                    break
+                except queue.Full:
+                    try:
+                        events.get_nowait()
+                    except queue.Empty:
+                        pass
+
+    def getStats(self):
+        with self._Lock:
+            return {
+                "subscribers": len(self._Subscribers),
+                "watching": self._Watcher is not None,
+                "last_id": self._LastId,
+                "events": self._Events,
+            }
+
+    def stream(self, Events, Heartbeat=STREAM_HEARTBEAT_SECONDS):
+        """Generator of the server-sent events of a subscriber queue; unsubscribes when closed."""
+        try:
+            # The comment is sent at once, so the browser reports the connection as open
+            yield ": connected\n\n"
+            while True:
+                try:
+                    yield format_event(Events.get(timeout=Heartbeat))
+                except queue.Empty:
+                    yield ": keepalive\n\n"
+        finally:
+            self.unsubscribe(Events)
+
+    def registerRoute(self, server):
+        """Serve the event stream from the Flask server of the app under STREAM_ROUTE."""
+        from flask import Response
+
+        def result_events():
+            response = Response(self.stream(self.subscribe()), mimetype="text/event-stream")
+            response.headers["Cache-Control"] = "no-cache"
+            response.headers["X-Accel-Buffering"] = "no"  # no buffering in an nginx proxy
+            return response
+
+        server.add_url_rule(STREAM_ROUTE, "result_events", result_events)
+
+    @classmethod
+    def _afterFork(cls):
+        # Background callback jobs never serve the stream; a forked lock may have been held by the parent
+        cls._Subscribers = set()
+        cls._Lock = threading.Lock()
+        cls._Watcher = None
+        cls._LastId = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=UltraTorkWebResultStream._afterFork)
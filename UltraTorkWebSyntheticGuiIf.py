@@ -0,0 +1,158 @@
+import os
+import random
+import sqlite3
+from datetime import datetime, timedelta
+
+from UltraTorkWebResultDb import RESULT_TABLE, RUN_TIME_FORMAT
+
+# Defaults of the synthetic backend ("SyntheticResults", "SyntheticTestplaces", "SyntheticSeed",
+# "SyntheticDays" and "SyntheticTestsPerRun" in the parameter list)
+SYNTHETIC_RESULTS = 10000
+SYNTHETIC_TESTPLACES = 4
+SYNTHETIC_SEED = 1
+SYNTHETIC_DAYS = 365
+SYNTHETIC_TESTS_PER_RUN = 50
+
+# Fixed end of the generated history, so a seed always gives the same data
+SYNTHETIC_END = datetime(2024, 7, 31)
+
+# Raw result types and how often they occur
+SYNTHETIC_RESULT_WEIGHTS = {"PASS": 80, "FAIL": 9, "TC_FAIL": 4, "APP_ERROR": 3, "SPORADIC_BEHAVIOR": 2, "ERROR": 2}
+
+SYNTHETIC_SW_VERSIONS = ["V{}.{}.{}".format(major, minor, patch)
+                         for major in (1, 2) for minor in range(4) for patch in range(3)]
+
+
+class UltraTorkWebGuiIf:
+    """Stand-in for UltraTorkWebGuiIf that generates its results instead of reading UltraTork.
+
+    Used by benchmark.py in place of the real interface. The history is a seeded
+    schedule of runs spread over SyntheticDays up to SYNTHETIC_END; every run
+    carries SyntheticTestsPerRun results. A run is generated from the seed and
+    its position alone, so getTcResultList() of one testplace and
+    writeResultDb() return the same results, with the same ids, without
+    keeping the history in memory.
+    """
+
+    _ParameterList = {}
+    _Days = SYNTHETIC_DAYS
+    _Runs = []
+    _TpNames = []
+    _SelectedTp = None
+    _SelectedTpConfig = None
+    _FilterTpName = None
+
+    def setParameterList(self, ParameterList, WebIf=None):
+        results = int(ParameterList.get("SyntheticResults", SYNTHETIC_RESULTS))
+        testplaces = max(1, int(ParameterList.get("SyntheticTestplaces", SYNTHETIC_TESTPLACES)))
+        seed = ParameterList.get("SyntheticSeed", SYNTHETIC_SEED)
+        days = float(ParameterList.get("SyntheticDays", SYNTHETIC_DAYS))
+        tests_per_run = max(1, int(ParameterList.get("SyntheticTestsPerRun", SYNTHETIC_TESTS_PER_RUN)))
+
+        tp_names = ["TP{:02d}".format(i + 1) for i in range(testplaces)]
+
+        # Run schedule: (run start, testplace, first id, number of results), ordered by run start, so the
+        # ids grow with time like in the result database
+        rng = random.Random("{}:schedule".format(seed))
+        start = SYNTHETIC_END - timedelta(days=days)
+        runs = []
+        remaining = results
+        while remaining > 0:
+            count = min(tests_per_run, remaining)
+            offset = rng.random() * days * 86400
+            runs.append((start + timedelta(seconds=offset), rng.choice(tp_names), count))
+            remaining -= count
+        runs.sort()
+
+        first_id = 1
+        UltraTorkWebGuiIf._Runs = []
+        for run_index, (run_start, tp_name, count) in enumerate(runs):
+            UltraTorkWebGuiIf._Runs.append((run_index, run_start, tp_name, first_id, count))
+            first_id += count
+
+        UltraTorkWebGuiIf._ParameterList = dict(ParameterList, SyntheticSeed=seed)
+        UltraTorkWebGuiIf._Days = days
+        UltraTorkWebGuiIf._TpNames = tp_names
+        UltraTorkWebGuiIf._SelectedTp = tp_names[0]
+        UltraTorkWebGuiIf._SelectedTpConfig = tp_names[0]
+        UltraTorkWebGuiIf._FilterTpName = tp_names[0]
+
+    def getTpNameList(self):
+        return list(self._TpNames)
+
+    def getTpSelectedTp(self):
+        return self._SelectedTp
+
+    def getSelectedTpNameConfigPage(self):
+        return self._SelectedTpConfig
+
+    def setSelectedTpNameConfigPage(self, TpName):
+        UltraTorkWebGuiIf._SelectedTpConfig = TpName
+
+    def getTpConfigData(self):
+        tp_name = self._SelectedTpConfig or ""
+        base = "/synthetic/" + tp_name
+        return {"TpName": tp_name, "Appendix": "", "TestData": base + "/TestData", "Path": base,
+                "DBPath": base + "/UltraTork.db", "Config": base + "/Config.json", "Outputfile": base + "/Output.xml",
+                "DataPath": base + "/Data", "Workspace": base + "/Workspace", "XmlOutputPath": base + "/Xml"}
+
+    def setResultDataFilterTpName(self, TpName):
+        UltraTorkWebGuiIf._FilterTpName = TpName
+
+    def getTcResultList(self):
+        """Runs of the filtered testplace: [[run timestamp, [result, ...]], ...].
+
+        Each result is [id, testplace, name, SW version, start, end, runtime, result type, try].
+        """
+        return [[run[1].strftime(RUN_TIME_FORMAT), self._runResults(run)]
+                for run in self._Runs if run[2] == self._FilterTpName]
+
+    def getResultCount(self):
+        return sum(run[4] for run in self._Runs)
+
+    def _runResults(self, Run):
+        run_index, run_start, tp_name, first_id, count = Run
+        rng = random.Random("{}:run:{}".format(self._ParameterList["SyntheticSeed"], run_index))
+        # Newer runs test newer SW versions
+        age = (SYNTHETIC_END - run_start).total_seconds() / (self._Days * 86400)
+        sw_version = SYNTHETIC_SW_VERSIONS[min(len(SYNTHETIC_SW_VERSIONS) - 1,
+                                               int((1 - age) * len(SYNTHETIC_SW_VERSIONS)))]
+        result_types = list(SYNTHETIC_RESULT_WEIGHTS)
+        weights = list(SYNTHETIC_RESULT_WEIGHTS.values())
+
+        results = []
+        start = run_start
+        for i in range(count):
+            runtime = round(rng.lognormvariate(3.0, 0.8), 3)
+            end = start + timedelta(seconds=runtime)
+            result_type = rng.choices(result_types, weights)[0]
+            retry = 2 if result_type != "PASS" and rng.random() < 0.3 else 1
+            results.append([first_id + i, tp_name, "Tc{:04d}".format(rng.randrange(1, 500)), sw_version,
+                            start.strftime(RUN_TIME_FORMAT), end.strftime(RUN_TIME_FORMAT), runtime,
+                            result_type, retry])
+            start = end
+        return results
+
+    def writeResultDb(self, Path, ChunkRuns=200):
+        """Write all results into a new SQLite result table at Path, in the RESULT_TABLE layout."""
+        if os.path.exists(Path):
+            os.remove(Path)
+
+        t = RESULT_TABLE
+        columns = ("Id", "TpName", "RunStart", "TcName", "SwVersion", "Start", "End", "Runtime", "Result", "Try")
+        conn = sqlite3.connect(Path)
+        try:
+            conn.execute("CREATE TABLE {} ({} INTEGER PRIMARY KEY, {} TEXT, {} TEXT, {} TEXT, {} TEXT, {} TEXT, "
+                         "{} TEXT, {} REAL, {} TEXT, {} INTEGER)".format(t["Table"], *(t[c] for c in columns)))
+            sql = "INSERT INTO {} ({}) VALUES ({})".format(t["Table"], ", ".join(t[c] for c in columns),
+                                                         ", ".join("?" * len(columns)))
+            for begin in range(0, len(self._Runs), ChunkRuns):
+                rows = []
+                for run in self._Runs[begin:begin + ChunkRuns]:
+                    run_start = run[1].strftime(RUN_TIME_FORMAT)
+                    rows.extend((r[0], r[1], run_start, r[2], r[3], r[4], r[5], r[6], r[7], r[8])
+                                for r in self._runResults(run))
+                conn.executemany(sql, rows)
+            conn.commit()
+        finally:
+            conn.close()
@@ -0,0 +1,232 @@
+// Clientside callbacks for pure UI state; they run in the browser without a request to the server.
+window.dash_clientside = Object.assign({}, window.dash_clientside, {
+    ultratork: {
+        // index.py: open and close the testing menu
+        toggle_offcanvas: function(n, is_open) {
+            return n ? !is_open : is_open;
+        },
+
+        // index.py: clear the testplace selection
+        clear_dropdown: function(n_clicks) {
+            return n_clicks ? [] : window.dash_clientside.no_update;
+        },
+
+        // main.py, index.py and Implementation.py: open the result stream while the shown page
+        // listens to it (assets/UltraTorkWebResultStream.js); a new page closes it until it asks again
+        set_result_stream: function(enabled) {
+            window.UltraTorkResultStream.setEnabled(enabled === true);
+            return enabled === true;
+        },
+
+        // Implementation.py: open and close the filter modal
+        toggle_filter_modal: function(open_clicks, close_clicks, is_open) {
+            return (open_clicks || close_clicks) ? !is_open : is_open;
+        },
+
+        // Implementation.py: add the results of a result stream event to the status bars and have
+        // the tables fetch their page again when the shown testplace got new results. The counts
+        // include the results up to status.lastId: older events are dropped, and an event that
+        // does not start there has the server count again instead of being added
+        apply_impl_result_event: function(event, status) {
+            const no_update = window.dash_clientside.no_update;
+            if (!event || !status || event.to <= status.lastId) {
+                return [no_update, no_update, no_update, no_update, no_update];
+            }
+            if (event.from !== status.lastId) {
+                return [no_update, no_update, no_update, event.to, event.to];
+            }
+            const counts = Object.assign({}, status.counts);
+            let added = 0;
+            event.rows.forEach(function(row) {
+                const day = row[1].slice(0, 10);
+                if (row[0] !== status.tp || (status.types && !status.types.includes(row[2])) ||
+                    (status.start && (day < status.start.slice(0, 10) || day > status.end.slice(0, 10)))) {
+                    return;
+                }
+                counts[row[2]] = (counts[row[2]] || 0) + row[3];
+                added += row[3];
+            });
+            const new_status = Object.assign({}, status, {counts: counts, lastId: event.to});
+            if (!added) {
+                return [no_update, no_update, new_status, no_update, no_update];
+            }
+            // Same text as create_status_text()
+            const pass_count = counts['PASS'] || 0;
+            const fail_count = counts['FAIL'] || 0;
+            const total = Object.values(counts).reduce((a, b) => a + b, 0);
+            const text = 'Total: ' + total + ' | Pass: ' + pass_count + ' | Fail: ' + fail_count +
+                         ' | Other: ' + (total - pass_count - fail_count);
+            return [text, text, new_status, event.to, no_update];
+        },
+
+        // Implementation.py: reduce a cell click in either result table to the key of its row
+        activate_result_row: function(list_cell, time_cell) {
+            const triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+            const cell = triggered.includes('result-table-list.active_cell') ? list_cell : time_cell;
+            if (!cell || cell.row_id === undefined || cell.row_id === null) {
+                return window.dash_clientside.no_update;
+            }
+            return cell.row_id;
+        },
+
+        // Config_tp.py: open and close the modal, add a new testcase to the dropdown and
+        // fill the dropdown with the testplaces load_tp_names() stored
+        toggle_config_modal: function(n1, n2, n3, tp_names, is_open, options, tc_value) {
+            const no_update = window.dash_clientside.no_update;
+            const triggered = window.dash_clientside.callback_context.triggered.map(t => t.prop_id);
+            if (triggered.includes('config-tp-names.data')) {
+                if (!tp_names) {
+                    return [is_open, '', options, no_update];
+                }
+                return [is_open, '', tp_names.names.map(i => ({label: i, value: i})), tp_names.selected];
+            }
+            if (triggered.includes('open-new-tp.n_clicks')) {
+                const name = tc_value || 'New Testcase';
+                return [true, tc_value, (options || []).concat([{label: name, value: name}]), no_update];
+            }
+            if (n1 || n2) {
+                return [!is_open, '', options, no_update];
+            }
+            return [is_open, '', options, no_update];
+        },
+
+        // index.py: merge a result stream event into the graphs when it continues the cursor of
+        // every shown testplace, otherwise let fetch_missed_results() count the results up to it
+        apply_result_event: function(event, enabled, cursor, counts) {
+            const no_update = window.dash_clientside.no_update;
+            if (!enabled || !event || !cursor || !counts) {
+                return [no_update, no_update];
+            }
+            const last_ids = Object.values(cursor);
+            if (last_ids.every(id => id >= event.to)) {
+                return [no_update, no_update];
+            }
+            if (!last_ids.every(id => id === event.from)) {
+                return [no_update, {upTo: event.to}];
+            }
+            const new_cursor = {};
+            Object.keys(cursor).forEach(tp => { new_cursor[tp] = event.to; });
+            const rows = event.rows.filter(row => row[0] in cursor).map(row => [
+                row[0],
+                Date.parse(row[1].replace(' ', 'T') + 'Z'),
+                row[2] in counts.typeIndex ? counts.typeIndex[row[2]] : counts.otherIndex,
+                row[3]
+            ]);
+            return [{base: cursor, cursor: new_cursor, rows: rows}, no_update];
+        },
+
+        // index.py: add the results of apply_result_event() or fetch_missed_results() to the counts of
+        // the graphs and redraw them; both only carry the new results, counted per testplace, hour
+        // and result type
+        merge_new_results: function(delta, counts, line_counts, bar_fig, pie_fig, line_fig, line_tps) {
+            const no_update = window.dash_clientside.no_update;
+            const status = window.dash_clientside.callback_context.outputs_list[3];
+            const unchanged = [no_update, no_update, no_update, status.map(() => no_update),
+                               no_update, no_update, no_update];
+            // Deltas of an older selection or of a cursor that was already merged are dropped
+            if (!delta || !counts || JSON.stringify(delta.base) !== JSON.stringify(counts.cursor)) {
+                return unchanged;
+            }
+
+            const DAY = 86400000;
+            const bucket = function(level, ms) {
+                if (level === 'hour') {
+                    return ms;
+                }
+                const day = Math.floor(ms / DAY);
+                if (level === 'week') {
+                    return (day - (day + 3) % 7) * DAY;  // 1970-01-01 was a Thursday
+                }
+                if (level === 'month') {
+                    const d = new Date(ms);
+                    return Date.UTC(d.getUTCFullYear(), d.getUTCMonth(), 1);
+                }
+                return day * DAY;
+            };
+
+            // Daily grid [testplace][day][result type], days sorted
+            const days = counts.days.slice();
+            const grid = counts.grid.map(tp => tp.map(day => day.slice()));
+            const types = pie_fig.data[0].labels.length;
+            // Trend lines per testplace, buckets sorted
+            const lines = line_counts ? {x: line_counts.x.map(x => x.slice()), y: line_counts.y.map(y => y.slice())}
+                                      : null;
+
+            delta.rows.forEach(function(row) {
+                const tp = counts.tps.indexOf(row[0]);
+                if (tp < 0) {
+                    return;
+                }
+                const day = bucket('day', row[1]);
+                let d = days.indexOf(day);
+                if (d < 0) {
+                    d = days.findIndex(x => x > day);
+                    d = d < 0 ? days.length : d;
+                    days.splice(d, 0, day);
+                    grid.forEach(g => g.splice(d, 0, new Array(types).fill(0)));
+                }
+                grid[tp][d][row[2]] += row[3];
+
+                const line = lines ? (line_tps || []).indexOf(row[0]) : -1;
+                const x = lines ? bucket(line_counts.level, row[1]) : 0;
+                if (line >= 0 && x >= line_counts.from && (line_counts.to === null || x < line_counts.to)) {
+                    const xs = lines.x[line];
+                    let i = xs.indexOf(x);
+                    if (i < 0) {
+                        i = xs.findIndex(v => v > x);
+                        i = i < 0 ? xs.length : i;
+                        xs.splice(i, 0, x);
+                        lines.y[line].splice(i, 0, 0);
+                    }
+                    lines.y[line][i] += row[3];
+                }
+            });
+
+            // Bars: every (testplace, day) with results, testplace major like update_combined_graphs()
+            const bar_x = [];
+            const bar_text = [];
+            const bar_y = bar_fig.data.map(() => []);
+            const totals = new Array(types).fill(0);
+            grid.forEach(function(tp_days, tp) {
+                tp_days.forEach(function(day, d) {
+                    if (day.some(c => c > 0)) {
+                        bar_x.push(days[d]);
+                        bar_text.push(counts.tps[tp]);
+                        day.forEach((c, t) => { bar_y[t].push(c); totals[t] += c; });
+                    }
+                });
+            });
+            const show_text = bar_x.length * bar_fig.data.length <= counts.textLimit;
+            const bar_data = bar_fig.data.map((trace, t) => Object.assign({}, trace, {
+                x: bar_x, y: bar_y[t], text: show_text ? bar_text : null
+            }));
+            const pie_data = [Object.assign({}, pie_fig.data[0], {values: totals})];
+            const line_data = lines ? line_fig.data.map((trace, i) => Object.assign({}, trace, {
+                x: lines.x[i], y: lines.y[i]
+            })) : line_fig.data;
+
+            return [
+                Object.assign({}, bar_fig, {data: bar_data}),
+                Object.assign({}, pie_fig, {data: pie_data}),
+                lines ? Object.assign({}, line_fig, {data: line_data}) : no_update,
+                status.map(s => String(totals[s.id.index])),
+                Object.assign({}, counts, {days: days, grid: grid, cursor: delta.cursor}),
+                delta.cursor,
+                lines ? Object.assign({}, line_counts, {x: lines.x, y: lines.y}) : no_update
+            ];
+        },
+
+        // Config_database.py: show the inputs of the selected database type
+        toggle_params: function(database_typ) {
+            const show = {display: 'block'};
+            const hide = {display: 'none'};
+            if (database_typ === 'SqlLite') {
+                return [show, hide, show];
+            }
+            if (database_typ === 'MySQL') {
+                return [hide, show, show];
+            }
+            return [hide, hide, hide];
+        }
+    }
+});
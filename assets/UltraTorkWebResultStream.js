@@ -0,0 +1,38 @@
+// Result stream (UltraTorkWebResultStream.py): at most one connection per browser tab, open only while
+// the shown page listens to it (set_result_stream() in UltraTorkWebClientside.js); every open stream
+// holds a server thread and one of the few connections the browser keeps to the server. Every event
+// is written to the result-event store of the app layout, which the callbacks of the pages listen to.
+// The browser reconnects by itself; events missed meanwhile, or while the stream was closed, are
+// detected by the pages from the result ids.
+window.UltraTorkResultStream = (function() {
+    let source = null;
+
+    function open() {
+        if (source || !window.EventSource) {
+            return;
+        }
+        source = new EventSource('/events/results');
+        source.addEventListener('results', function(message) {
+            if (window.dash_clientside && window.dash_clientside.set_props) {
+                window.dash_clientside.set_props('result-event', {data: JSON.parse(message.data)});
+            }
+        });
+    }
+
+    function close() {
+        if (source) {
+            source.close();
+            source = null;
+        }
+    }
+
+    return {
+        setEnabled: function(enabled) {
+            if (enabled) {
+                open();
+            } else {
+                close();
+            }
+        }
+    };
+})();
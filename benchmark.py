@@ -0,0 +1,146 @@
+"""Micro-benchmarks of the dashboard callbacks on synthetic results.
+
+The pages run against UltraTorkWebSyntheticGuiIf and a SQLite result database it
+generates, so no UltraTork installation is needed. For every result count the
+callbacks are run --repeat times after one warm-up run; the report shows the
+median and best time, the peak of traced Python memory and the size of the
+response as Dash serializes it.
+
+    python benchmark.py --results 10000 100000 1000000 --testplaces 8
+"""
+import argparse
+import contextvars
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import UltraTorkWebSyntheticGuiIf
+
+# The pages import the interface by its real name
+sys.modules["UltraTorkWebGuiIf"] = UltraTorkWebSyntheticGuiIf
+
+import dash
+from dash._callback_context import context_value
+from dash._utils import AttributeDict
+from plotly.io.json import to_json_plotly
+
+from UltraTorkWebResultDb import UltraTorkWebResultDb
+from UltraTorkWebSyntheticGuiIf import UltraTorkWebGuiIf
+
+BENCHMARK_RESULTS = [10000, 100000]
+BENCHMARK_REPEAT = 5
+
+
+def create_synthetic_backend(results, testplaces, seed, workdir, cache):
+    """Configure the synthetic interface and a result database with its results; reuses databases on disk."""
+    parameters = {"SyntheticResults": results, "SyntheticTestplaces": testplaces, "SyntheticSeed": seed}
+    gui = UltraTorkWebGuiIf()
+    gui.setParameterList(parameters)
+
+    db_path = os.path.join(workdir, "synthetic-{}-{}-{}.sqlite".format(seed, testplaces, results))
+    if not os.path.exists(db_path):
+        begin = time.perf_counter()
+        gui.writeResultDb(db_path + ".tmp")
+        os.replace(db_path + ".tmp", db_path)
+        print("Generated {} results in {:.1f} s: {}".format(results, time.perf_counter() - begin, db_path))
+
+    db = UltraTorkWebResultDb()
+    db.setParameterList({"DBType": "SqlLite", "DBHost": db_path, "ResultCache": cache})
+    db.setupSchema()
+    return gui
+
+
+def triggered_by(prop_id, func):
+    """Wrap func to run in a callback context, as Dash runs a callback fired by the input prop_id."""
+    def run():
+        context_value.set(AttributeDict(triggered_inputs=[{"prop_id": prop_id, "value": None}]))
+        return func()
+    return lambda: contextvars.copy_context().run(run)
+
+
+def get_benchmarks(gui):
+    """(name, function) of the benchmarked callbacks, with the arguments a page would send."""
+    import index
+    import Implementation
+
+    tp_names = gui.getTpNameList()
+    tp_name = gui.getTpSelectedTp()
+    # A result from the middle of the history, as a click on a table row would select it
+    result_id = (gui.getResultCount() + 1) // 2
+
+    return [
+        ("update_combined_graphs", lambda: index.create_dashboard(tp_names)),
+        # One page of a result table, which replaced the full result list the page layout used to build
+        ("update_result_table", triggered_by("result-table-list.page_current",
+                                             lambda: Implementation.update_result_table(0, 50, [], '', tp_name, 'ALL',
+                                                                                        None, None))),
+        ("update_page_content", lambda: Implementation.update_page_content(tp_name, 'ALL', None, None)),
+        ("display_detailed_info", lambda: Implementation.display_detailed_info(result_id)),
+    ]
+
+
+def measure(func, repeat):
+    """Run func once to warm up, then repeat times; returns times in ms, peak memory and response size.
+
+    Tracing memory slows allocations down, so the peak is taken from one more run of its own.
+    """
+    response_bytes = len(to_json_plotly(func()))
+
+    times = []
+    for _ in range(repeat):
+        begin = time.perf_counter()
+        func()
+        times.append((time.perf_counter() - begin) * 1000)
+
+    tracemalloc.start()
+    try:
+        func()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    return {"median_ms": statistics.median(times), "min_ms": min(times), "peak_kb": peak / 1024,
+            "response_kb": response_bytes / 1024}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--results", type=int, nargs="+", default=BENCHMARK_RESULTS, help="result counts to run")
+    parser.add_argument("--testplaces", type=int, default=8)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--repeat", type=int, default=BENCHMARK_REPEAT)
+    parser.add_argument("--cache", action="store_true", help="keep the result cache on (off measures the queries)")
+    parser.add_argument("--only", nargs="+", help="names of the callbacks to run")
+    parser.add_argument("--workdir", default=os.path.join(tempfile.gettempdir(), "UltraTorkWebBenchmark"))
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    os.makedirs(args.workdir, exist_ok=True)
+    # The pages register themselves with the app when they are imported
+    dash.Dash(__name__, use_pages=True, pages_folder="", suppress_callback_exceptions=True)
+
+    report = []
+    print("{:<26} {:>9} {:>11} {:>11} {:>11} {:>12}".format(
+        "callback", "results", "median ms", "min ms", "peak KB", "response KB"))
+    for results in args.results:
+        gui = create_synthetic_backend(results, args.testplaces, args.seed, args.workdir, args.cache)
+        for name, func in get_benchmarks(gui):
+            if args.only and name not in args.only:
+                continue
+            row = dict(callback=name, results=results, testplaces=args.testplaces, **measure(func, args.repeat))
+            report.append(row)
+            print("{callback:<26} {results:>9} {median_ms:>11.1f} {min_ms:>11.1f} {peak_kb:>11.0f} "
+                  "{response_kb:>12.1f}".format(**row))
+
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -1,72 +1,44 @@
 import dash
 import dash_bootstrap_components as dbc
-from dash import Input, Output, html, callback, dcc, State
-import plotly.express as px
-import plotly.graph_objects as go
-from datetime import date
+from dash import ALL, Input, Output, html, callback, clientside_callback, dcc, State, ClientsideFunction
+from datetime import datetime, timedelta, timezone
+import numpy as np
 
 from UltraTorkWebGuiIf import UltraTorkWebGuiIf
+from UltraTorkWebResultDb import ROLLUP_LEVELS, UltraTorkWebResultDb, rollup_bucket
+from UltraTorkWebFigures import BAR_TEXT_THRESHOLD, bar_figure, date_array, line_figure, message_figure, pie_figure
+from UltraTorkWebChrome import CONTENT_STYLE, cached_fragment, create_sidebar, icons_stylesheet
+from UltraTorkWebMetrics import timed
 
 # Initialize the data interface class
 GuiDataClass = UltraTorkWebGuiIf()
+ResultDbClass = UltraTorkWebResultDb()
 
 # Register the page for Dash
 dash.register_page(__name__, path='/')
 
-# Define styles for the sidebar and main content
-SIDEBAR_STYLE = {
-    "position": "fixed",
-    "top": 0,
-    "left": 0,
-    "bottom": 0,
-    "width": "16rem",
-    "padding": "2rem 1rem",
-    "background-color": "#343a40",  # Darker background
-    "color": "#ffffff",  # White text
-    "transition": "all 0.3s",
-}
 
-CONTENT_STYLE = {
-    "margin-left": "18rem",
-    "margin-right": "2rem",
-    "padding": "2rem 1rem",
+# Result categories shown on the dashboard and the raw result types counted into them
+RESULT_TYPES = ['PASS', 'FAIL', 'ERROR', 'TC-Error', 'App-Error', 'Sop-Error']
+RESULT_TYPE_MAP = {
+    "PASS": 'PASS',
+    "FAIL": 'FAIL',
+    "TC_FAIL": 'TC-Error',
+    "APP_ERROR": 'App-Error',
+    "SPORADIC_BEHAVIOR": 'Sop-Error',
 }
+# Position in RESULT_TYPES of every raw result type, for the result stream merged in the browser
+RESULT_TYPE_INDEX = {r: RESULT_TYPES.index(t) for r, t in RESULT_TYPE_MAP.items()}
 
+# Most buckets per testplace in the trend graph; the finest rollup level that stays below it is shown
+LINE_MAX_BUCKETS = 500
 
-def create_sidebar():
-    """Create the sidebar layout with improved styling."""
-    offcanvas = dbc.Offcanvas(
-        [
-            dbc.NavItem(dbc.NavLink(
-                [html.I(className="bi bi-caret-right-fill me-2"), "Database Settings"],
-                href="/config_database",
-                id="database-settings-link"
-            )),
-            dbc.Tooltip("Configure database settings", target="database-settings-link"),
-
-            dbc.NavItem(dbc.NavLink(
-                [html.I(className="bi bi-gear-fill me-2"), "Testplace Configuration"],
-                href="/config_tp",
-                id="testplace-config-link"
-            )),
-            dbc.Tooltip("Configure testplaces", target="testplace-config-link"),
-
-            dbc.NavItem(dbc.NavLink(
-                [html.I(className="bi bi-pencil-square me-2"), "Edit Testplace"],
-                href="/impl",
-                id="edit-testplace-link"
-            )),
-            dbc.Tooltip("Edit testplaces", target="edit-testplace-link"),
-        ],
-        id="offcanvas",
-        title="Testing Menu",
-        is_open=False,
-        style={"background-color": "#343a40", "color": "#ffffff"}  # Darker offcanvas
-    )
 
-    TpList = GuiDataClass.getTpNameList()
+def create_testplace_selection():
+    """Create the testplace selection shown below the sidebar menu."""
+    # The testplace list is loaded by load_tp_names() once the page is shown
     TpListData = dcc.Dropdown(
-        options=[{"label": i, "value": i} for i in TpList],
+        options=[],
         id="graph-tp-name-dropdown",
         multi=True,
         placeholder="Select Testplaces",
@@ -74,47 +46,132 @@ def create_sidebar():
                "color": "#333333"}  # Slightly off-white for better visibility
     )
 
-    sidebar = html.Div(
+    return html.Div(
         [
-            html.Img(src="/static/images/ultratronikLogoU.png", height="60px", style={"margin-bottom": "20px"}),
-            dbc.NavbarBrand("UltraTorkWeb", className="ms-2", style={"font-size": "21px", "font-weight": "bold"}),
-            dbc.Nav(
-                [
-                    dbc.NavLink("Dashboard", href="/", className="bi bi-house", id="dashboard-link"),
-                    dbc.Tooltip("Go to the dashboard", target="dashboard-link"),
-
-                    dbc.NavLink("Testing Menu", href="/", id="open-offcanvas", className="bi bi-geo-alt", active=True),
-                    dbc.Tooltip("Open testing menu", target="open-offcanvas"),
-
-                    dbc.NavLink("Documentation", href="/documentation", className="bi bi-pen", id="documentation-link"),
-                    dbc.Tooltip("View documentation", target="documentation-link"),
-                ],
-                vertical=True,
-                pills=True,
-            ),
-            offcanvas,
-            html.Div(
-                [
-                    dbc.Label("Select Testplaces"),
-                    TpListData,
-                    dbc.Button("Update Graph", id="update-graph-button", color="primary", className="mt-2",
-                               style={"border-radius": "20px"}),
-                    dbc.Tooltip("Update the graphs with selected testplaces", target="update-graph-button"),
-
-                    dbc.Button("Clear Selection", id="clear-selection-button", color="dark", className="mt-2",
-                               style={"border-radius": "20px"}),
-                    dbc.Tooltip("Clear the selected testplaces", target="clear-selection-button")
-                ],
-                className="mt-4"
-            )
+            dbc.Label("Select Testplaces"),
+            TpListData,
+            dbc.Button("Update Graph", id="update-graph-button", color="primary", className="mt-2",
+                       style={"border-radius": "20px"}),
+            dbc.Tooltip("Update the graphs with selected testplaces", target="update-graph-button"),
+
+            dbc.Button("Clear Selection", id="clear-selection-button", color="dark", className="mt-2",
+                       style={"border-radius": "20px"}),
+            dbc.Tooltip("Clear the selected testplaces", target="clear-selection-button")
         ],
-        style=SIDEBAR_STYLE,
+        className="mt-4"
     )
 
-    return sidebar
-
 
-def create_graph_page():
+def intern_values(values):
+    """Dictionary-encode a sequence: return (ids, distinct values in first-seen order)."""
+    lookup = {}
+    ids = np.fromiter((lookup.setdefault(v, len(lookup)) for v in values), dtype=np.int32, count=len(values))
+    return ids, list(lookup)
+
+
+def count_grid(index_arrays, shape, weights=None):
+    """Count (or sum weights) per cell of an n-dimensional grid with one np.bincount."""
+    size = int(np.prod(shape))
+    if size == 0:
+        return np.zeros(shape, dtype=np.int64)
+    flat = np.ravel_multi_index(index_arrays, shape)
+    counts = np.bincount(flat, weights=weights, minlength=size)
+    if weights is not None:
+        counts = counts.round().astype(np.int64)
+    return counts.reshape(shape)
+
+
+def create_daily_count_grid(count_rows, tp_names):
+    """Fold (date, testplace, result type, count) rows into a [testplace, day, result type] grid."""
+    if not count_rows:
+        return np.zeros((len(tp_names), 0, len(RESULT_TYPES)), dtype=np.int64), []
+
+    date_strs, tps, result_types, counts = zip(*count_rows)
+    dates, day_ids = np.unique(np.array(date_strs), return_inverse=True)
+    tp_lookup = {tp_name: i for i, tp_name in enumerate(tp_names)}
+    tp_ids = np.fromiter((tp_lookup[tp] for tp in tps), dtype=np.int32, count=len(tps))
+    result_ids, result_names = intern_values(result_types)
+    categories = np.array([RESULT_TYPES.index(RESULT_TYPE_MAP.get(r, 'ERROR')) for r in result_names])
+
+    grid = count_grid((tp_ids, day_ids, categories[result_ids]),
+                      (len(tp_names), len(dates), len(RESULT_TYPES)),
+                      weights=np.array(counts, dtype=np.float64))
+    return grid, dates.tolist()
+
+
+def choose_rollup_level(start, end):
+    """Finest rollup level with at most LINE_MAX_BUCKETS buckets between two datetimes."""
+    span = (end - start).total_seconds()
+    for level, spec in ROLLUP_LEVELS.items():
+        if span / spec["Seconds"] <= LINE_MAX_BUCKETS:
+            return level
+    return level
+
+
+def parse_x_range(relayout_data):
+    """Visible x range of a relayoutData event as (start, end) datetimes.
+
+    Returns None for a reset of the zoom and False for events that do not change the x range.
+    """
+    if not relayout_data:
+        return False
+    if relayout_data.get('xaxis.autorange'):
+        return None
+    if 'xaxis.range[0]' in relayout_data and 'xaxis.range[1]' in relayout_data:
+        bounds = [relayout_data['xaxis.range[0]'], relayout_data['xaxis.range[1]']]
+    elif 'xaxis.range' in relayout_data:
+        bounds = relayout_data['xaxis.range']
+    else:
+        return False
+
+    # Date axes report "YYYY-MM-DD[ HH:MM:SS.ffff]"; numbers are epoch milliseconds. Both become naive UTC
+    # datetimes like the run timestamps of the rollup.
+    return tuple(datetime.fromtimestamp(b / 1000, timezone.utc).replace(tzinfo=None) if isinstance(b, (int, float))
+                 else datetime.fromisoformat(str(b)[:19]) for b in bounds)
+
+
+def create_trend_figure(tp_names, x_range=None, progress=None):
+    """Line graph of the results per testplace, at the rollup level matching the x range.
+
+    Without a range the whole history of the testplaces is shown. progress(done, total, tp_name)
+    is called as the buckets of each testplace arrive. Returns the figure and its data for the
+    line-graph-counts store, which the auto refresh adds new results to.
+    """
+    whole_history = x_range is None
+    if whole_history:
+        first, last = ResultDbClass.getRollupRange(tp_names)
+        if first is None:
+            return line_figure("Trend of Results Over Time", [], uirevision=",".join(tp_names)), None
+        x_range = (datetime.fromisoformat(first), datetime.fromisoformat(last) + timedelta(days=1))
+
+    start, end = (b.strftime("%Y-%m-%d %H:%M:%S") for b in x_range)
+    level = choose_rollup_level(*x_range)
+    count_rows = ResultDbClass.getBucketResultCountsByTp(level, tp_names, rollup_bucket(level, start), end,
+                                                         Progress=progress)
+
+    # Total results per (testplace, bucket); buckets are only read from the rollup, so they are exact
+    lines = [(tp_name, np.zeros(0), np.zeros(0, dtype=np.int64)) for tp_name in tp_names]
+    if count_rows:
+        buckets, tps, _, counts = zip(*count_rows)
+        bucket_keys, bucket_ids = np.unique(np.array(buckets), return_inverse=True)
+        tp_lookup = {tp_name: i for i, tp_name in enumerate(tp_names)}
+        tp_ids = np.fromiter((tp_lookup[tp] for tp in tps), dtype=np.int32, count=len(tps))
+        totals = count_grid((tp_ids, bucket_ids), (len(tp_names), len(bucket_keys)),
+                            weights=np.array(counts, dtype=np.float64))
+        x = date_array(bucket_keys)
+        for tp_index, tp_name in enumerate(tp_names):
+            shown = np.flatnonzero(totals[tp_index])
+            lines[tp_index] = (tp_name, x[shown], totals[tp_index, shown])
+
+    # New results only extend the buckets inside the loaded range; the whole history has no upper bound
+    line_counts = {"level": level, "x": [x.tolist() for _, x, _ in lines], "y": [y.tolist() for _, _, y in lines],
+                   "from": float(date_array([rollup_bucket(level, start)])[0]), "to": None if whole_history
+                   else float(date_array([end])[0])}
+    return line_figure("Trend of Results Over Time (per {})".format(level), lines,
+                       uirevision=",".join(tp_names)), line_counts
+
+
+def create_graph_page(auto_refresh):
     """Create the graph page layout."""
     return html.Div(
         [
@@ -122,9 +179,22 @@ def create_graph_page():
                 [
                     dbc.Col(
                         [
+                            dbc.Switch(id="auto-refresh-switch", value=auto_refresh, className="mb-2",
+                                       label="Auto refresh"),
+                            # Counts shown in the graphs, the ids they include, the results found since
+                            # and the id up to which missed results have to be fetched
+                            dcc.Store(id="dashboard-counts"),
+                            dcc.Store(id="dashboard-cursor"),
+                            dcc.Store(id="dashboard-delta"),
+                            dcc.Store(id="dashboard-catchup"),
+                            dcc.Store(id="line-graph-counts"),
+                            # Shown while update_combined_graphs() is running in the background
+                            dbc.Progress(id="graph-progress", value=0, max=1, striped=True, animated=True,
+                                         className="mb-2", style={"visibility": "hidden"}),
                             dcc.Loading(dcc.Graph(id="combined-bar-graph")),
                             dcc.Loading(dcc.Graph(id="combined-pie-chart")),
-                            dcc.Loading(dcc.Graph(id="line-graph"))  # New line graph
+                            dcc.Loading(dcc.Graph(id="line-graph")),  # New line graph
+                            dcc.Store(id="line-graph-tps")  # Testplaces shown in the line graph
                         ],
                         width=9
                     )
@@ -138,22 +208,23 @@ def create_status_cards(pass_count, fail_count, error_count, tc_count, app_count
     """Create status cards to show pass, fail, and error counts."""
     return dbc.Row(
         [
-            create_status_card("Total Pass", pass_count, "success"),
-            create_status_card("Total Fail", fail_count, "danger"),
-            create_status_card("Total Errors", error_count, "warning"),
-            create_status_card("Total TC-Errors", tc_count, "info"),
-            create_status_card("Total App-Errors", app_count, "warning"),
-            create_status_card("Total SOP-Errors", sop_count, "dark")
+            create_status_card("Total Pass", pass_count, "success", 0),
+            create_status_card("Total Fail", fail_count, "danger", 1),
+            create_status_card("Total Errors", error_count, "warning", 2),
+            create_status_card("Total TC-Errors", tc_count, "info", 3),
+            create_status_card("Total App-Errors", app_count, "warning", 4),
+            create_status_card("Total SOP-Errors", sop_count, "dark", 5)
         ]
     )
 
 
-def create_status_card(title, count, color):
-    """Helper function to create individual status card."""
+def create_status_card(title, count, color, index):
+    """Helper function to create individual status card; index is the position in RESULT_TYPES."""
     return dbc.Col(
         dbc.Card(
             dbc.CardBody(
-                [html.H4(title, className="card-title"), html.P(f"{count}", className="card-text")],
+                [html.H4(title, className="card-title"),
+                 html.P(f"{count}", className="card-text", id={"type": "status-count", "index": index})],
             ),
             color=color,
             inverse=True
@@ -162,158 +233,189 @@ def create_status_card(title, count, color):
     )
 
 
-@callback(
+# Open and close the testing menu; runs in the browser (assets/UltraTorkWebClientside.js)
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="toggle_offcanvas"),
     Output("offcanvas", "is_open"),
     [Input("open-offcanvas", "n_clicks")],
     [State("offcanvas", "is_open")],
 )
-def toggle_offcanvas(n, is_open):
-    return not is_open if n else is_open
 
 
 @callback(
+    Output('graph-tp-name-dropdown', 'options'),
+    [Input('index-url', 'pathname')]
+)
+def load_tp_names(pathname):
+    return [{"label": i, "value": i} for i in GuiDataClass.getTpNameList()]
+
+
+# Clear the testplace selection; runs in the browser
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="clear_dropdown"),
     Output('graph-tp-name-dropdown', 'value'),
     [Input('clear-selection-button', 'n_clicks')]
 )
-def clear_dropdown(n_clicks):
-    return [] if n_clicks else dash.no_update
 
 
 @callback(
     [Output('combined-bar-graph', 'figure'),
      Output('combined-pie-chart', 'figure'),
      Output('line-graph', 'figure'),  # Output for line graph
-     Output('status-cards', 'children')],
-    [Input('update-graph-button', 'n_clicks')],
-    [State('graph-tp-name-dropdown', 'value')]
+     Output('status-cards', 'children'),
+     Output('line-graph-tps', 'data'),
+     Output('dashboard-counts', 'data'),
+     Output('dashboard-cursor', 'data'),
+     Output('line-graph-counts', 'data')],
+    [Input('update-graph-button', 'n_clicks'), Input('line-graph', 'relayoutData')],
+    [State('graph-tp-name-dropdown', 'value'), State('line-graph-tps', 'data')],
+    # Runs as a job of the background callback manager (set up in main.py), so the aggregation does not
+    # hold a web worker. A new click or zoom replaces the running job, a new selection cancels it.
+    background=True,
+    progress=[Output('graph-progress', 'value'), Output('graph-progress', 'max'), Output('graph-progress', 'label')],
+    running=[(Output('graph-progress', 'style'), {"visibility": "visible"}, {"visibility": "hidden"})],
+    cancel=[Input('graph-tp-name-dropdown', 'value')],
 )
-def update_combined_graphs(n_clicks, selected_tp_names):
+def update_combined_graphs(set_progress, n_clicks, relayout_data, selected_tp_names, line_tp_names):
+    changed_id = [p['prop_id'] for p in dash.callback_context.triggered][0]
+    if 'line-graph.relayoutData' in changed_id:
+        # Zoom or pan of the line graph: load the buckets of the visible range for the testplaces shown
+        x_range = parse_x_range(relayout_data)
+        if x_range is False or not line_tp_names:
+            raise dash.exceptions.PreventUpdate
+
+        def trend_progress(done, total, tp_name):
+            set_progress((done, total, tp_name))
+
+        line_fig, line_counts = create_trend_figure(line_tp_names, x_range, progress=trend_progress)
+        return dash.no_update, dash.no_update, line_fig, dash.no_update, dash.no_update, dash.no_update, \
+            dash.no_update, line_counts
+
+    return create_dashboard(selected_tp_names, set_progress)
+
+
+def create_dashboard(selected_tp_names, set_progress=lambda progress: None):
+    """Outputs of update_combined_graphs() for a new selection of testplaces.
+
+    set_progress((done, total, label)) is called as the queries progress.
+    """
     if not selected_tp_names:
-        empty_fig = px.pie(names=['No Data'], values=[1], title="No Testplaces Selected")
-        return empty_fig, empty_fig, empty_fig, create_status_cards(0, 0, 0, 0, 0, 0)
+        empty_fig = pie_figure("No Testplaces Selected", ['No Data'], [1])
+        return empty_fig, empty_fig, empty_fig, create_status_cards(0, 0, 0, 0, 0, 0), [], None, {}, None
 
-    data = {'Date': [], 'Result Type': [], 'Count': [], 'Testplace': []}
-    aggregate_data = {'Result Type': ['PASS', 'FAIL', 'ERROR', 'TC-Error', 'App-Error', 'Sop-Error'],
-                      'Count': [0, 0, 0, 0, 0, 0]}
+    # One step for the rollup, then one per testplace for the daily counts and for the trend
+    steps = 1 + 2 * len(selected_tp_names)
 
-    line_data = {'Date': [], 'Count': [], 'Testplace': []}  # Data for the line graph
+    def count_progress(done, total, tp_name):
+        set_progress((1 + done, steps, tp_name))
+
+    def trend_progress(done, total, tp_name):
+        set_progress((1 + total + done, steps, tp_name))
 
     try:
-        for tp_name in selected_tp_names:
-            GuiDataClass.setResultDataFilterTpName(tp_name)
-            ResultTcList = GuiDataClass.getTcResultList()
-
-            daily_counts = {}
-            for ResultTc in ResultTcList:
-                date_str = ResultTc[0].split(" ")[0]
-                if date_str not in daily_counts:
-                    daily_counts[date_str] = {'PASS': 0, 'FAIL': 0, 'ERROR': 0, 'TC-Error': 0, 'App-Error': 0,
-                                              'Sop-Error': 0}
-
-                for result in ResultTc[1]:
-                    result_type = result[7]
-                    if result_type == "PASS":
-                        daily_counts[date_str]['PASS'] += 1
-                    elif result_type == "FAIL":
-                        daily_counts[date_str]['FAIL'] += 1
-                    elif result_type == "TC_FAIL":
-                        daily_counts[date_str]['TC-Error'] += 1
-                    elif result_type == "APP_ERROR":
-                        daily_counts[date_str]['App-Error'] += 1
-                    elif result_type == "SPORADIC_BEHAVIOR":
-                        daily_counts[date_str]['Sop-Error'] += 1
-                    else:
-                        daily_counts[date_str]['ERROR'] += 1
-
-            for date, counts in daily_counts.items():
-                data['Date'].extend([date] * 6)
-                data['Result Type'].extend(['PASS', 'FAIL', 'ERROR', 'TC-Error', 'App-Error', 'Sop-Error'])
-                data['Count'].extend(
-                    [counts['PASS'], counts['FAIL'], counts['ERROR'], counts['TC-Error'], counts['App-Error'],
-                     counts['Sop-Error']])
-                data['Testplace'].extend([tp_name] * 6)
-
-                aggregate_data['Count'][0] += counts['PASS']
-                aggregate_data['Count'][1] += counts['FAIL']
-                aggregate_data['Count'][2] += counts['ERROR']
-                aggregate_data['Count'][3] += counts['TC-Error']
-                aggregate_data['Count'][4] += counts['App-Error']
-                aggregate_data['Count'][5] += counts['Sop-Error']
-
-                # Prepare data for the line graph
-                for result_type in ['PASS', 'FAIL', 'ERROR', 'TC-Error', 'App-Error', 'Sop-Error']:
-                    line_data['Date'].extend([date] * len(selected_tp_names))
-                    line_data['Count'].extend([counts[result_type]] * len(selected_tp_names))
-                    line_data['Testplace'].extend([tp_name] * len(selected_tp_names))
+        # Fold new results into the daily rollup, then read the selected testplaces from it
+        # concurrently and fold them into a [testplace, day, result type] grid
+        set_progress((0, steps, "Rollup"))
+        ResultDbClass.updateRollup()
+        # The counts and the id of the last result they include are read together, even while another
+        # process folds new results; the auto refresh continues from that id
+        count_rows, cursor = ResultDbClass.getDailyResultCountsByTp(selected_tp_names, Progress=count_progress)
+        grid, dates = create_daily_count_grid(count_rows, selected_tp_names)
+        dates = date_array(dates)
+
+        # Bars: every (testplace, day) with results, testplace major like the selection
+        tp_ids, days = np.nonzero(grid.sum(axis=2))
+        bar_series = {result_type: grid[tp_ids, days, i] for i, result_type in enumerate(RESULT_TYPES)}
+        bar_text = np.array(selected_tp_names, dtype=object)[tp_ids]
+
+        # Line graph to show trends over time, over the whole history at a coarse level
+        line_fig, line_counts = create_trend_figure(selected_tp_names, progress=trend_progress)
+
+        aggregate_counts = grid.sum(axis=(0, 1)).tolist()
 
     except Exception as e:
         print(f"An error occurred: {e}")
-        return px.bar(title="Error"), px.pie(title="Error"), px.line(title="Error"), create_status_cards(0, 0, 0, 0, 0,
-                                                                                                         0)
-
-    combined_bar_fig = px.bar(
-        data_frame=data,
-        x='Date',
-        y='Count',
-        color='Result Type',
-        barmode='group',
-        title="Combined Testplace Results by Date",
-        text='Testplace'
-    )
+        error_fig = message_figure("Error")
+        return error_fig, error_fig, error_fig, create_status_cards(0, 0, 0, 0, 0, 0), [], None, {}, None
 
-    combined_bar_fig.update_layout(
-        yaxis_title='Count',
-        xaxis_title='Date',
-        legend_title_text='Result Type',
-        xaxis=dict(tickmode='linear'),
-        barmode='group',
-        plot_bgcolor='#f4f4f4',  # Light background
-        paper_bgcolor='#ffffff'  # White background
-    )
+    combined_bar_fig = bar_figure("Combined Testplace Results by Date", dates[days], bar_series, text=bar_text)
+    combined_pie_fig = pie_figure("Aggregate Results", RESULT_TYPES, aggregate_counts)
 
-    combined_pie_fig = px.pie(
-        data_frame=aggregate_data,
-        names='Result Type',
-        values='Count',
-        title="Aggregate Results"
-    )
+    status_cards = create_status_cards(*aggregate_counts)
 
-    # Line graph to show trends over time
-    line_fig = px.line(
-        data_frame=line_data,
-        x='Date',
-        y='Count',
-        color='Testplace',
-        title="Trend of Results Over Time",
-        markers=True
-    )
+    # Compact copy of the grid for the auto refresh, which adds new results to it in the browser
+    dashboard_counts = {"tps": selected_tp_names, "days": dates.tolist(), "grid": grid.tolist(),
+                        "cursor": cursor, "textLimit": BAR_TEXT_THRESHOLD, "typeIndex": RESULT_TYPE_INDEX,
+                        "otherIndex": RESULT_TYPES.index('ERROR')}
 
-    line_fig.update_layout(
-        xaxis_title='Date',
-        yaxis_title='Count',
-        plot_bgcolor='#f4f4f4',  # Light background
-        paper_bgcolor='#ffffff'  # White background
-    )
+    return combined_bar_fig, combined_pie_fig, line_fig, status_cards, selected_tp_names, dashboard_counts, \
+        cursor, line_counts
 
-    status_cards = create_status_cards(
-        aggregate_data['Count'][0],
-        aggregate_data['Count'][1],
-        aggregate_data['Count'][2],
-        aggregate_data['Count'][3],
-        aggregate_data['Count'][4],
-        aggregate_data['Count'][5]
-    )
 
-    return combined_bar_fig, combined_pie_fig, line_fig, status_cards
+# Callback to keep the result stream (UltraTorkWebResultStream.py) open while the auto refresh is on;
+# runs in the browser
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="set_result_stream"),
+    Output('result-stream', 'data', allow_duplicate=True),
+    Input('auto-refresh-switch', 'value'),
+    prevent_initial_call='initial_duplicate'
+)
+
+# Turn an event of the result stream (UltraTorkWebResultStream.py) into a delta of the graphs while the
+# auto refresh is on; runs in the browser. Events that do not continue the cursor ask for a catch-up.
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="apply_result_event"),
+    [Output('dashboard-delta', 'data', allow_duplicate=True), Output('dashboard-catchup', 'data')],
+    [Input('result-event', 'data')],
+    [State('auto-refresh-switch', 'value'), State('dashboard-cursor', 'data'), State('dashboard-counts', 'data')],
+    prevent_initial_call=True
+)
+
+
+@callback(
+    Output('dashboard-delta', 'data'),
+    [Input('dashboard-catchup', 'data')],
+    [State('dashboard-cursor', 'data')],
+    prevent_initial_call=True
+)
+def fetch_missed_results(catchup, cursor):
+    """Fetch the results between the cursor and the id of the stream event that did not continue it."""
+    if not cursor or not catchup:
+        raise dash.exceptions.PreventUpdate
+
+    # Without missed results the delta still moves the cursor up to the event
+    rows, new_cursor = ResultDbClass.getResultCountsSince(cursor, UpTo=catchup["upTo"])
+    tps, hours, result_types, counts = zip(*rows) if rows else ((), (), (), ())
+    categories = [RESULT_TYPES.index(RESULT_TYPE_MAP.get(r, 'ERROR')) for r in result_types]
+    return {"base": cursor, "cursor": new_cursor,
+            "rows": [list(row) for row in zip(tps, date_array(hours).tolist(), categories, counts)]}
+
+
+# Add the new results to the counts held in the browser and redraw the graphs from them
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="merge_new_results"),
+    [Output('combined-bar-graph', 'figure', allow_duplicate=True),
+     Output('combined-pie-chart', 'figure', allow_duplicate=True),
+     Output('line-graph', 'figure', allow_duplicate=True),
+     Output({"type": "status-count", "index": ALL}, 'children'),
+     Output('dashboard-counts', 'data', allow_duplicate=True),
+     Output('dashboard-cursor', 'data', allow_duplicate=True),
+     Output('line-graph-counts', 'data', allow_duplicate=True)],
+    [Input('dashboard-delta', 'data')],
+    [State('dashboard-counts', 'data'), State('line-graph-counts', 'data'), State('combined-bar-graph', 'figure'),
+     State('combined-pie-chart', 'figure'), State('line-graph', 'figure'), State('line-graph-tps', 'data')],
+    prevent_initial_call=True
+)
 
 
-def create_index_page():
+def create_index_page(auto_refresh):
     """Create the main index page layout."""
     return html.Div(
         [
-            html.Link(href="https://cdn.jsdelivr.net/npm/bootstrap-icons@1.9.0/font/bootstrap-icons.css",
-                      rel="stylesheet"),
-            html.Div(id="sidebar", children=create_sidebar()),
+            icons_stylesheet(),
+            dcc.Location(id='index-url', refresh=False),
+            html.Div(id="sidebar", children=create_sidebar(
+                cached_fragment("index-testplace-selection", create_testplace_selection))),
             html.Div(id="page-content", style=CONTENT_STYLE, children=[
                 dbc.Card(
                     [
@@ -321,7 +423,7 @@ def create_index_page():
                         dbc.CardBody(
                             [
                                 html.Div(id='status-cards'),
-                                create_graph_page()
+                                create_graph_page(auto_refresh)
                             ]
                         )
                     ]
@@ -331,6 +433,9 @@ def create_index_page():
     )
 
 
-# Define the main layout of the app
-layout = create_index_page()
+# Define the main layout of the app; Dash builds it per request, not at import
+@timed("layout")
+def layout(refresh=None, **kwargs):
+    # "?refresh" switches the auto refresh on
+    return create_index_page(refresh is not None)
 
@@ -1,9 +1,15 @@
+import copy
+import logging
 import os
 import sys
+import time
+
+StartupTime = time.perf_counter()
 
 import dash
 import dash_bootstrap_components as dbc
-from dash import html
+import diskcache
+from dash import ClientsideFunction, Input, Output, clientside_callback, dcc, html
 
 sys.path.append('/local/projekte/UX-EES-TSFW/TestPc/TestFrameWork/TestFrameWork')
 sys.path.append('/local/projekte/UX-EES-TSFW/TestPc/TestFrameWork/UltraTorkWeb')
@@ -12,7 +18,11 @@ sys.path.append('/local/projekte/UX-EES-TSFW/TestPc/TestFrameWork')
 import UltraTorkWebIf
 
 from UltraTorkWebGuiIf import UltraTorkWebGuiIf
-from TestFrameWorkPara import readParameter
+from UltraTorkWebResultDb import UltraTorkWebResultDb
+from UltraTorkWebConfigStore import UltraTorkWebConfigStore
+from UltraTorkWebResultStream import UltraTorkWebResultStream
+from UltraTorkWebMetrics import UltraTorkWebMetrics, instrument_class
+from UltraTorkWebProfiler import UltraTorkWebProfiler
 
 path, filename = os.path.split(os.path.abspath(__file__))
 
@@ -22,7 +32,11 @@ if os.path.isdir(TcStepPath):
         if filename.find(".png") != -1:
             os.remove(TcStepPath + "/" + filename)
 
-PARAMETERLIST = readParameter(path + "/UltraTorkWebConfig.json")
+# UltraTorkWebConfig.json is read and written through the store, here and in the pages, with the same absolute path
+ConfigStore = UltraTorkWebConfigStore()
+ConfigStore.setPath(path + "/UltraTorkWebConfig.json")
+# The interfaces below keep and extend the parameter list, the store's copy stays unchanged
+PARAMETERLIST = copy.deepcopy(ConfigStore.read())
 
 WebIf = UltraTorkWebIf.UltraTorkWebIf(TcStepPath,
                                       True,
@@ -31,13 +45,43 @@ WebIf = UltraTorkWebIf.UltraTorkWebIf(TcStepPath,
                                       PARAMETERLIST["DBUserName"],
                                       PARAMETERLIST["DBPassword"])
 
+# Time spent in the UltraTork interface is reported per callback on /metrics
+instrument_class(UltraTorkWebGuiIf, "guiif")
+
 GuiDataClass = UltraTorkWebGuiIf()
 GuiDataClass.setParameterList(PARAMETERLIST, WebIf)
 WebIf.addTcListConfigPara(PARAMETERLIST)
 
-app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CERULEAN], use_pages=True, suppress_callback_exceptions=True)
+ResultDbClass = UltraTorkWebResultDb()
+ResultDbClass.setParameterList(PARAMETERLIST)
+# Schema changes run once per process, in the background: the counts are read from the result table until
+# the rollup tables are ready
+ResultDbClass.startSchemaSetup()
+
+# One watcher pushes new results to all open pages (assets/UltraTorkWebResultStream.js)
+ResultStream = UltraTorkWebResultStream()
+ResultStream.setParameterList(PARAMETERLIST)
+
+# Background callbacks (the dashboard graphs) run as jobs in their own processes, queued in a disk cache
+BackgroundCallbackManager = dash.DiskcacheManager(diskcache.Cache(PARAMETERLIST.get("JobCachePath", path + "/cache")))
+
+app = dash.Dash(__name__, external_stylesheets=[dbc.themes.CERULEAN], use_pages=True, suppress_callback_exceptions=True,
+                background_callback_manager=BackgroundCallbackManager)
+ResultStream.registerRoute(app.server)
+Metrics = UltraTorkWebMetrics()
+Metrics.registerRoute(app)
+# Counters of the result cache of the web process; background jobs run without one
+Metrics.addCollector(ResultDbClass.getCacheMetrics)
+
+# Admins profile single callback calls on /profiles?token=... (only with a "ProfileToken")
+Profiler = UltraTorkWebProfiler()
+Profiler.setPath(PARAMETERLIST.get("ProfilePath", path + "/profiles"), PARAMETERLIST)
+Profiler.registerRoute(app)
 
 app.layout = html.Div([
+    # Last event of the result stream, shared by the pages, and whether the stream is open
+    dcc.Store(id='result-event'),
+    dcc.Store(id='result-stream', data=False),
     dbc.Card([
         dbc.CardBody([
             dash.page_container
@@ -45,10 +89,23 @@ app.layout = html.Div([
     ])
 ])
 
+# Callback to close the result stream when another page is shown; the pages that listen to it open it
+# again (index.py while the auto refresh is on, Implementation.py); runs in the browser
+clientside_callback(
+    ClientsideFunction(namespace="ultratork", function_name="set_result_stream"),
+    Output('result-stream', 'data'),
+    Input('_pages_location', 'pathname')
+)
+
+# Page layouts are built per request, so this covers imports, configuration and page registration
+StartupSeconds = time.perf_counter() - StartupTime
+logging.getLogger("UltraTorkWeb").info("Startup took %.0f ms", StartupSeconds * 1000)
+Metrics.addCollector(lambda: [("ultratork_startup_seconds", "gauge", "Time main.py took to import and set up the app.",
+                               StartupSeconds)])
 
 
 if __name__ == "__main__":
-    app.run_server(port=8888, debug=True)
+    app.run_server(port=8888, debug=True, threaded=True)
 
 
 
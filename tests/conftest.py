@@ -0,0 +1,96 @@
+import os
+import sqlite3
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from UltraTorkWebMetrics import UltraTorkWebMetrics  # noqa: E402
+from UltraTorkWebResultDb import RESULT_TABLE, UltraTorkWebResultDb  # noqa: E402
+from UltraTorkWebSyntheticGuiIf import UltraTorkWebGuiIf  # noqa: E402
+
+# Small synthetic history shared by the tests: testplaces TP01..TP03
+TEST_RESULTS = 2000
+TEST_TESTPLACES = 3
+
+RESULT_COLUMNS = ("Id", "TpName", "RunStart", "TcName", "SwVersion", "Start", "End", "Runtime", "Result", "Try")
+
+
+@pytest.fixture(scope="session")
+def synthetic_db(tmp_path_factory):
+    """Path of a SQLite result database with the synthetic history; copy it before writing to it."""
+    gui = UltraTorkWebGuiIf()
+    gui.setParameterList({"SyntheticResults": TEST_RESULTS, "SyntheticTestplaces": TEST_TESTPLACES})
+    path = str(tmp_path_factory.mktemp("synthetic") / "results.sqlite")
+    gui.writeResultDb(path)
+    return path
+
+
+@pytest.fixture
+def db_path(synthetic_db, tmp_path):
+    path = str(tmp_path / "results.sqlite")
+    source = sqlite3.connect(synthetic_db)
+    target = sqlite3.connect(path)
+    source.backup(target)
+    source.close()
+    target.close()
+    return path
+
+
+def open_result_db(path, **parameters):
+    """UltraTorkWebResultDb on a SQLite file, set up like main.py does it."""
+    db = UltraTorkWebResultDb()
+    db.setParameterList(dict({"DBType": "SqlLite", "DBHost": path}, **parameters))
+    db.setupSchema()
+    return db
+
+
+def add_results(path, tp_name, count, run_start="2024-07-31 12:00:00,000000", result="PASS", first_id=None):
+    """Append count results of one run to the result table; returns their ids.
+
+    first_id gives the results lower ids than the newest one, like a MySQL transaction that
+    took its auto-increment ids before another one and commits after it.
+    """
+    t = RESULT_TABLE
+    conn = sqlite3.connect(path)
+    try:
+        if first_id is None:
+            first_id = conn.execute("SELECT COALESCE(MAX({}), 0) + 1 FROM {}".format(t["Id"],
+                                                                                     t["Table"])).fetchone()[0]
+        rows = [(first_id + i, tp_name, run_start, "TcNew", "V9.9.9", run_start, run_start, 1.0, result, 1)
+                for i in range(count)]
+        conn.executemany("INSERT INTO {} ({}) VALUES ({})".format(
+            t["Table"], ", ".join(t[c] for c in RESULT_COLUMNS), ", ".join("?" * len(RESULT_COLUMNS))), rows)
+        conn.commit()
+    finally:
+        conn.close()
+    return [row[0] for row in rows]
+
+
+def raw_counts(path, sql, args=()):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(sql, args).fetchall()
+    finally:
+        conn.close()
+
+
+@pytest.fixture
+def metrics(monkeypatch):
+    """UltraTorkWebMetrics without the collectors other tests added."""
+    monkeypatch.setattr(UltraTorkWebMetrics, "_Collectors", [])
+    return UltraTorkWebMetrics()
+
+
+@pytest.fixture(scope="session")
+def pages():
+    """The page modules, registered with a Dash app on the synthetic interface like benchmark.py does it."""
+    import UltraTorkWebSyntheticGuiIf
+    sys.modules.setdefault("UltraTorkWebGuiIf", UltraTorkWebSyntheticGuiIf)
+
+    import dash
+    dash.Dash(__name__, use_pages=True, pages_folder="", suppress_callback_exceptions=True)
+    import index
+    import Implementation
+    return {"index": index, "Implementation": Implementation}
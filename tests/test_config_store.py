@@ -0,0 +1,80 @@
+import json
+import os
+import stat
+
+import pytest
+
+import UltraTorkWebConfigStore as config_module
+from UltraTorkWebConfigStore import CONFIG_FILE_MODE, UltraTorkWebConfigStore
+
+
+@pytest.fixture
+def config_path(tmp_path):
+    path = tmp_path / "UltraTorkWebConfig.json"
+    path.write_text(json.dumps({"DBType": "SqlLite", "Tp": {"TP01": {"Tc": 1}}}))
+    os.chmod(path, 0o664)
+    UltraTorkWebConfigStore().setPath(str(path))
+    return path
+
+
+def leftovers(path):
+    return sorted(name for name in os.listdir(path.parent) if name.endswith(".tmp"))
+
+
+def test_update_replaces_the_file_and_keeps_its_mode(config_path):
+    store = UltraTorkWebConfigStore()
+    inode = os.stat(config_path).st_ino
+
+    assert store.update(lambda config: config["Tp"].update({"TP02": {}})) is None
+    assert json.loads(config_path.read_text())["Tp"] == {"TP01": {"Tc": 1}, "TP02": {}}
+    assert os.stat(config_path).st_ino != inode
+    assert stat.S_IMODE(os.stat(config_path).st_mode) == 0o664
+    assert store.read()["Tp"]["TP02"] == {}
+    assert leftovers(config_path) == []
+
+
+def test_new_file_gets_the_default_mode(tmp_path):
+    store = UltraTorkWebConfigStore()
+    store.setPath(str(tmp_path / "UltraTorkWebConfig.json"))
+
+    store.update(lambda config: config.update({"DBType": "MySQL"}))
+    assert stat.S_IMODE(os.stat(tmp_path / "UltraTorkWebConfig.json").st_mode) == CONFIG_FILE_MODE
+
+
+def test_failed_write_leaves_the_old_file(config_path, monkeypatch):
+    before = config_path.read_text()
+
+    def broken_dump(data, json_file, **kwargs):
+        json_file.write('{"DBType": ')
+        raise OSError("disk full")
+    monkeypatch.setattr(config_module.json, "dump", broken_dump)
+
+    with pytest.raises(OSError):
+        UltraTorkWebConfigStore().update(lambda config: config.update({"DBType": "MySQL"}))
+    assert config_path.read_text() == before
+    assert leftovers(config_path) == []
+
+
+def test_broken_json_raises_and_is_not_written_over(config_path):
+    store = UltraTorkWebConfigStore()
+    config_path.write_text('{"DBType": "SqlLite",')
+
+    with pytest.raises(ValueError, match="not valid JSON"):
+        store.read()
+    with pytest.raises(ValueError):
+        store.update(lambda config: config.update({"DBType": "MySQL"}))
+    assert config_path.read_text() == '{"DBType": "SqlLite",'
+
+
+def test_mutator_returning_false_writes_nothing(config_path):
+    store = UltraTorkWebConfigStore()
+    stamp = os.stat(config_path)
+
+    def reject(config):
+        config["DBType"] = "MySQL"
+        return False
+    assert store.update(reject) is False
+    assert (os.stat(config_path).st_ino, os.stat(config_path).st_mtime_ns) == (stamp.st_ino, stamp.st_mtime_ns)
+    # The change to the copy does not reach the shared config either
+    assert store.read()["DBType"] == "SqlLite"
+    assert leftovers(config_path) == []
@@ -0,0 +1,84 @@
+from datetime import datetime
+
+import pytest
+from conftest import add_results, open_result_db, raw_counts
+
+from UltraTorkWebResultDb import UltraTorkWebResultDb
+
+
+@pytest.mark.parametrize("relayout, expected", [
+    (None, False),
+    ({"autosize": True}, False),
+    ({"xaxis.autorange": True}, None),
+    ({"xaxis.range[0]": "2024-07-01 06:30:00.5", "xaxis.range[1]": "2024-07-02"},
+     (datetime(2024, 7, 1, 6, 30), datetime(2024, 7, 2))),
+    ({"xaxis.range": [1719792000000, 1719878400000.0]}, (datetime(2024, 7, 1), datetime(2024, 7, 2))),
+])
+def test_parse_x_range(pages, relayout, expected):
+    assert pages["index"].parse_x_range(relayout) == expected
+
+
+@pytest.fixture
+def dashboard(pages, db_path):
+    """index.create_dashboard() on a copy of the synthetic history, with the result cache on."""
+    return pages["index"], open_result_db(db_path), db_path
+
+
+def assert_counts_match_cursor(db_path, outputs):
+    # The graphs count exactly the results up to the cursor, so the auto refresh neither skips nor repeats any
+    dashboard_counts, cursor = outputs[5], outputs[6]
+    for tp_name, tp_grid in zip(dashboard_counts["tps"], dashboard_counts["grid"]):
+        shown = sum(sum(day) for day in tp_grid)
+        assert shown == raw_counts(db_path, "SELECT COUNT(*) FROM TcResult WHERE TpName = ? AND Id <= ?",
+                                   (tp_name, cursor[tp_name]))[0][0]
+    assert dashboard_counts["cursor"] == cursor
+
+
+def test_second_update_shows_the_new_results_at_once(dashboard):
+    index, db, db_path = dashboard
+    first = index.create_dashboard(["TP01", "TP02"])
+    assert_counts_match_cursor(db_path, first)
+
+    ids = add_results(db_path, "TP01", 10)
+    second = index.create_dashboard(["TP01", "TP02"])
+    assert_counts_match_cursor(db_path, second)
+    assert second[6]["TP01"] == ids[-1]
+    assert sum(second[5]["grid"][0][-1]) == sum(first[5]["grid"][0][-1]) + 10
+
+
+def test_counts_and_cursor_agree_when_another_process_folds_meanwhile(dashboard, monkeypatch):
+    index, db, db_path = dashboard
+    index.create_dashboard(["TP01"])
+
+    # Another process adds and folds results between this process's rollup update and its count queries
+    map_testplaces = UltraTorkWebResultDb.mapTestplaces
+    folded = []
+
+    def fold_then_map(self, func, TpNames, Progress=None):
+        if not folded:
+            folded.extend(add_results(db_path, "TP01", 10))
+            db.updateRollup()
+        return map_testplaces(self, func, TpNames, Progress)
+    monkeypatch.setattr(UltraTorkWebResultDb, "mapTestplaces", fold_then_map)
+    monkeypatch.setattr(index.ResultDbClass, "updateRollup", lambda: 0, raising=False)
+
+    outputs = index.create_dashboard(["TP01"])
+    assert_counts_match_cursor(db_path, outputs)
+    assert outputs[6]["TP01"] == folded[-1]
+
+
+def test_missed_results_continue_the_cursor(dashboard):
+    index, db, db_path = dashboard
+    cursor = index.create_dashboard(["TP01", "TP02"])[6]
+    ids = add_results(db_path, "TP02", 4, result="FAIL")
+    add_results(db_path, "TP03", 2)
+
+    delta = index.fetch_missed_results({"upTo": ids[-1]}, cursor)
+    assert delta["base"] == cursor
+    assert delta["cursor"] == {"TP01": ids[-1], "TP02": ids[-1]}
+    assert [(row[0], row[2], row[3]) for row in delta["rows"]] == [
+        ("TP02", index.RESULT_TYPES.index("FAIL"), 4)]
+
+    # Without missed results the cursor still moves up to the event
+    empty = index.fetch_missed_results({"upTo": ids[-1] + 2}, delta["cursor"])
+    assert empty["rows"] == [] and empty["cursor"] == {"TP01": ids[-1] + 2, "TP02": ids[-1] + 2}
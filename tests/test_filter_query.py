@@ -0,0 +1,41 @@
+import pytest
+
+
+@pytest.fixture
+def parse(pages):
+    return pages["Implementation"].parse_filter_query
+
+
+@pytest.mark.parametrize("query, filters", [
+    ('', []),
+    (None, []),
+    ('{name} contains "Tc01"', [("TcName", "contains", "Tc01")]),
+    ("{name} icontains 'a b'", [("TcName", "contains", "a b")]),
+    ('{result} = PASS', [("Result", "=", "PASS")]),
+    ('{result} seq FAIL', [("Result", "=", "FAIL")]),
+    ('{runtime} > 5', [("Runtime", ">", 5.0)]),
+    ('{try} ge 2', [("Try", ">=", 2.0)]),
+    ('{start} datestartswith 2024-07', [("Start", "startswith", "2024-07")]),
+    ('{sw} != V1.0.0 && {runtime} <= 2.5', [("SwVersion", "!=", "V1.0.0"), ("Runtime", "<=", 2.5)]),
+])
+def test_filters_map_to_database_fields(parse, query, filters):
+    assert parse(query) == filters
+
+
+@pytest.mark.parametrize("query", [
+    '{nr} > 5',             # row number, no database field
+    '{Id} = 1',             # not a table column
+    '{runtime} > fast',     # not a number
+    '{name} like Tc%',      # unsupported operator
+    'name contains Tc',     # no column braces
+])
+def test_unsupported_filters_are_dropped(parse, query):
+    assert parse(query) == []
+
+
+def test_columns_without_field_hide_sort_and_filter(pages):
+    impl = pages["Implementation"]
+    columns = {column_id for _, column_id in impl.RESULT_TABLE_LIST_COLUMNS + impl.RESULT_TABLE_TIME_COLUMNS}
+    hidden = {column_id for column_id in columns if 'data-dash-column="{}"'.format(column_id) in
+              " ".join(rule['selector'] for rule in impl.RESULT_TABLE_CSS)}
+    assert hidden == columns - set(impl.RESULT_TABLE_FIELDS) == {'nr'}
@@ -0,0 +1,28 @@
+import dash
+
+from UltraTorkWebMetrics import UltraTorkWebMetrics
+
+
+def test_failing_collector_does_not_break_the_metrics(metrics):
+    def broken():
+        raise RuntimeError("gone")
+    metrics.addCollector(broken)
+    assert "ultratork_callback_duration_seconds" in metrics.render()
+
+
+def test_requests_for_unknown_outputs_share_one_label(metrics, monkeypatch):
+    for name in ("_Latency", "_Size", "_Errors", "_Names"):
+        monkeypatch.setattr(UltraTorkWebMetrics, name, {})
+    app = dash.Dash(__name__)
+    app.layout = dash.html.Div()
+    metrics.registerRoute(app)
+
+    # Dash raises for unknown outputs; served, that is a 500 response
+    app.server.config["PROPAGATE_EXCEPTIONS"] = False
+    client = app.server.test_client()
+    for i in range(3):
+        client.post("/_dash-update-component", json={"output": "made-up-{}.children".format(i), "inputs": []})
+
+    text = client.get("/metrics").get_data(as_text=True)
+    assert 'ultratork_callback_duration_seconds_count{callback="unknown"} 3' in text
+    assert "made-up" not in text
@@ -0,0 +1,107 @@
+import multiprocessing
+import os
+
+import dash
+import pytest
+
+from UltraTorkWebProfiler import UltraTorkWebProfiler
+
+CALLBACK = "test_profiler.double"
+
+
+@pytest.fixture
+def profiler(tmp_path, monkeypatch):
+    for name, value in (("_App", None), ("_Installed", None), ("_Armed", {}), ("_Synced", None)):
+        monkeypatch.setattr(UltraTorkWebProfiler, name, value)
+    profiler = UltraTorkWebProfiler()
+    profiler.setPath(str(tmp_path / "profiles"), {"ProfileToken": "secret", "ProfileMaxCount": 3})
+    return profiler
+
+
+def create_app(profiler):
+    app = dash.Dash(__name__)
+    app.layout = dash.html.Div([dash.dcc.Input(id="value", value=1), dash.html.Div(id="double")])
+
+    @app.callback(dash.Output("double", "children"), dash.Input("value", "value"))
+    def double(value):
+        return value * 2
+
+    profiler.registerRoute(app)
+    return app
+
+
+def call_double(client):
+    return client.post("/_dash-update-component", json={
+        "output": "double.children", "outputs": {"id": "double", "property": "children"},
+        "inputs": [{"id": "value", "property": "value", "value": 21}], "changedPropIds": ["value.value"]})
+
+
+def test_arm_and_disarm_leave_markers_for_all_processes(profiler):
+    profiler.arm("pages.a.f")
+    profiler.arm("pages.b.f", "cprofile")
+    assert profiler.getArmed() == {"pages.a.f": "sample", "pages.b.f": "cprofile"}
+
+    # Arming again switches the mode, it does not add a second marker
+    profiler.arm("pages.a.f", "cprofile")
+    assert profiler.getArmed() == {"pages.a.f": "cprofile", "pages.b.f": "cprofile"}
+    profiler.disarm("pages.b.f")
+    assert profiler.getArmed() == {"pages.a.f": "cprofile"}
+    profiler.disarm()
+    assert profiler.getArmed() == {}
+
+    with pytest.raises(ValueError):
+        profiler.arm("pages.a.f", "perf")
+    with pytest.raises(ValueError):
+        profiler.arm("../pages.a.f")
+
+
+def test_armed_callback_is_profiled_once(profiler):
+    app = create_app(profiler)
+    dispatch = app.server.view_functions["/_dash-update-component"]
+    client = app.server.test_client()
+    profiler.arm(CALLBACK, "cprofile")
+    assert app.server.view_functions["/_dash-update-component"] is not dispatch
+
+    assert b"42" in call_double(client).data
+    profiles = profiler.listProfiles()
+    assert [(p["callback"], p["mode"]) for p in profiles] == [(CALLBACK, "cprofile")]
+    assert sorted(name.rsplit(".", 1)[1] for name in profiles[0]["files"]) == ["prof", "txt"]
+    assert profiler.getArmed() == {}
+    assert app.server.view_functions["/_dash-update-component"] is dispatch
+
+    call_double(client)
+    assert len(profiler.listProfiles()) == 1
+
+
+def arm_in_child():
+    UltraTorkWebProfiler().arm(CALLBACK)
+
+
+@pytest.mark.skipif(not hasattr(os, "fork"), reason="needs fork")
+def test_callback_armed_by_another_process_is_profiled(profiler):
+    app = create_app(profiler)
+    client = app.server.test_client()
+    call_double(client)
+
+    child = multiprocessing.get_context("fork").Process(target=arm_in_child)
+    child.start()
+    child.join()
+    assert child.exitcode == 0
+
+    call_double(client)
+    assert [(p["callback"], p["mode"]) for p in profiler.listProfiles()] == [(CALLBACK, "sample")]
+    assert profiler.getArmed() == {}
+
+
+def test_oldest_profiles_are_evicted(profiler, monkeypatch):
+    for second in range(5):
+        monkeypatch.setattr("UltraTorkWebProfiler.time.strftime", lambda fmt, s=second: "20240731-12000" + str(s))
+        profiler.profile("pages.a.f", "sample", sum, [1, 2])
+    assert [p["name"][:15] for p in profiler.listProfiles()] == ["20240731-120004", "20240731-120003",
+                                                                "20240731-120002"]
+
+    # The size quota removes the oldest profiles as well
+    kept = profiler.listProfiles()[0]["bytes"] + 1
+    monkeypatch.setattr(UltraTorkWebProfiler, "_MaxBytes", kept)
+    profiler._evict()
+    assert [p["name"][:15] for p in profiler.listProfiles()] == ["20240731-120004"]
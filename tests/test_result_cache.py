@@ -0,0 +1,155 @@
+from conftest import add_results, open_result_db, raw_counts
+
+from UltraTorkWebResultCache import ResultCache
+from UltraTorkWebResultDb import UltraTorkWebResultDb
+
+
+def test_entry_is_only_returned_for_its_token():
+    cache = ResultCache()
+    cache.put("key", (1,), [1, 2, 3])
+
+    assert cache.get("key", (1,)) == (True, [1, 2, 3])
+    assert cache.get("key", (2,)) == (False, None)
+    # A changed token drops the entry, it does not come back for the old token
+    assert cache.get("key", (1,)) == (False, None)
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["invalidations"], stats["entries"]) == (1, 2, 1, 0)
+
+
+def test_entries_expire(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr("UltraTorkWebResultCache.time.monotonic", lambda: now[0])
+    cache = ResultCache(Ttl=10.0)
+    cache.put("key", (1,), "value")
+
+    now[0] = 109.0
+    assert cache.get("key", (1,)) == (True, "value")
+    now[0] = 111.0
+    assert cache.get("key", (1,)) == (False, None)
+
+
+def test_least_recently_used_entries_are_evicted():
+    cache = ResultCache(MaxEntries=2)
+    cache.put("a", (1,), "a")
+    cache.put("b", (1,), "b")
+    cache.get("a", (1,))
+    cache.put("c", (1,), "c")
+
+    assert cache.get("b", (1,)) == (False, None)
+    assert cache.get("a", (1,))[0] and cache.get("c", (1,))[0]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_size_limit_evicts_and_skips_oversized_values():
+    cache = ResultCache(MaxBytes=2000)
+    cache.put("small", (1,), list(range(10)))
+    cache.put("large", (1,), list(range(1000)))
+    assert cache.get("large", (1,)) == (False, None)
+    assert cache.get("small", (1,))[0]
+
+    cache.put("medium", (1,), list(range(40)))
+    cache.put("medium2", (1,), list(range(40)))
+    stats = cache.stats()
+    assert stats["bytes"] <= 2000 and stats["evictions"] >= 1
+
+
+def test_new_results_invalidate_cached_queries_at_once(db_path):
+    db = open_result_db(db_path)
+    counts = db.countResults(["TP01"])
+    assert db.countResults(["TP01"]) is counts
+    assert db.getCacheStats()["hits"] == 1
+
+    add_results(db_path, "TP01", 7, result="FAIL")
+    assert db.countResults(["TP01"])["FAIL"] == counts["FAIL"] + 7
+
+
+def test_counts_come_with_the_id_of_the_last_result(db_path):
+    db = open_result_db(db_path)
+    counts, last_id = db.countResultsWithId(["TP01"])
+    assert counts == db.countResults(["TP01"]) and last_id == db.getLastResultId()
+
+    ids = add_results(db_path, "TP02", 3)
+    # Results of other testplaces move the id, not the counts
+    assert db.countResultsWithId(["TP01"]) == (counts, ids[-1])
+    assert db.countResultsWithId([]) == ({}, ids[-1])
+
+
+def test_rollup_update_invalidates_rollup_queries_at_once(db_path):
+    db = open_result_db(db_path)
+    db.updateRollup()
+    before = sum(row[3] for row in db.getDailyResultCounts(["TP02"]))
+
+    add_results(db_path, "TP02", 10)
+    db.updateRollup()
+    assert sum(row[3] for row in db.getDailyResultCounts(["TP02"])) == before + 10
+
+
+def test_change_token_follows_results_and_watermarks_of_its_testplaces(db_path):
+    db = open_result_db(db_path)
+    token = db.getChangeToken(["TP01"])
+
+    ids = add_results(db_path, "TP01", 2)
+    added = db.getChangeToken(["TP01"])
+    assert added != token
+    db.updateRollup()
+    folded = db.getChangeToken(["TP01"])
+    assert folded != added and {last_id for _, _, last_id in folded} == {ids[-1]}
+
+    # Results and folds of other testplaces leave it alone
+    add_results(db_path, "TP02", 3)
+    db.updateRollup()
+    assert db.getChangeToken(["TP01"]) == folded
+    assert db.getChangeToken(["TP01", "TP02"]) != db.getChangeToken(["TP01"])
+
+
+def test_cached_queries_survive_results_of_other_testplaces(db_path):
+    db = open_result_db(db_path)
+    db.updateRollup()
+    counts = db.countResults(["TP01"])
+    daily = db.getDailyResultCountsByTp(["TP01"])
+
+    add_results(db_path, "TP02", 5)
+    db.updateRollup()
+    assert db.countResults(["TP01"]) is counts
+    assert db.getDailyResultCountsByTp(["TP01"])[0] == daily[0]
+    assert db.getCacheStats()["invalidations"] == 0
+
+
+def test_counts_with_id_are_exact_up_to_a_later_settled_id(db_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("UltraTorkWebResultDb.time.monotonic", lambda: now[0])
+    db = open_result_db(db_path, ResultSettleSeconds=5)
+    db.getSettledResultId()
+    now[0] = 1006.0
+    counts, last_id = db.countResultsWithId(["TP01"])
+    assert last_id == db.getLastResultId()
+
+    # A result of another testplace settles: the cached counts hold up to the new id as well
+    ids = add_results(db_path, "TP02", 1)
+    db.countResultsWithId(["TP01"])
+    now[0] = 1012.0
+    assert db.countResultsWithId(["TP01"]) == (counts, ids[-1])
+    add_results(db_path, "TP01", 2)
+    assert db.countResultsWithId(["TP01"]) == (counts, ids[-1])
+    now[0] = 1018.0
+    counts, last_id = db.countResultsWithId(["TP01"])
+    assert sum(counts.values()) == raw_counts(db_path, "SELECT COUNT(*) FROM TcResult WHERE TpName = 'TP01'")[0][0]
+
+
+def test_forked_jobs_run_without_cache(db_path):
+    db = open_result_db(db_path)
+    UltraTorkWebResultDb._afterFork()
+    assert db.getCacheStats() == {}
+    assert db.countResults(["TP01"])
+
+
+def test_cache_counters_are_exported(db_path, metrics):
+    db = open_result_db(db_path)
+    db.countResults(["TP01"])
+    db.countResults(["TP01"])
+    metrics.addCollector(db.getCacheMetrics)
+
+    text = metrics.render()
+    assert "# TYPE ultratork_result_cache_hits_total counter\nultratork_result_cache_hits_total 1\n" in text
+    assert "ultratork_result_cache_misses_total 1\n" in text
+    assert "# TYPE ultratork_result_cache_entries gauge\nultratork_result_cache_entries 1\n" in text
@@ -0,0 +1,139 @@
+import threading
+
+from conftest import add_results, open_result_db, raw_counts
+
+from UltraTorkWebResultDb import ROLLUP_LEVELS, UltraTorkWebResultDb
+
+
+def daily_totals(db, tp_names):
+    totals = {}
+    for _, tp_name, _, count in db.getDailyResultCounts(tp_names):
+        totals[tp_name] = totals.get(tp_name, 0) + count
+    return totals
+
+
+def table_totals(path):
+    return dict(raw_counts(path, "SELECT TpName, COUNT(*) FROM TcResult GROUP BY TpName"))
+
+
+def test_rollup_levels_match_result_table(db_path):
+    db = open_result_db(db_path, ResultCache=False)
+    db.updateRollup()
+    tp_names = sorted(table_totals(db_path))
+
+    for level in ROLLUP_LEVELS:
+        assert db.getBucketResultCounts(level, tp_names) == db._getRawBucketResultCounts(level, tp_names)
+    assert db.getRollupWatermark()[0] == db.getLastResultId()
+
+
+def test_new_results_are_folded_once(db_path):
+    db = open_result_db(db_path, ResultCache=False)
+    db.updateRollup()
+    before = daily_totals(db, ["TP01"])["TP01"]
+
+    ids = add_results(db_path, "TP01", 10)
+    assert db.updateRollup() == 10
+    assert db.updateRollup() == 0
+    assert daily_totals(db, ["TP01"])["TP01"] == before + 10
+    for level in ROLLUP_LEVELS:
+        assert db.getRollupWatermark(level)[0] == ids[-1]
+
+
+def test_fold_with_a_stale_watermark_is_rejected(db_path):
+    # Two processes read the same watermark; only the first may fold the results above it
+    db = open_result_db(db_path, ResultCache=False)
+    db.updateRollup()
+    last_id, _ = db.getRollupWatermark()
+    add_results(db_path, "TP02", 5)
+    upper_id = db.getLastResultId()
+    groups = raw_counts(db_path, "SELECT TpName, SUBSTR(RunStart, 1, 13), Result, COUNT(*), SUM(Runtime), "
+                                 "MAX(RunStart) FROM TcResult WHERE Id > ? GROUP BY 1, 2, 3", (last_id,))
+
+    with db._connection() as conn:
+        assert db._foldRollup(conn, "day", groups, last_id, upper_id) == 5
+    with db._connection() as conn:
+        assert db._foldRollup(conn, "day", groups, last_id, upper_id) == 0
+
+    assert daily_totals(db, ["TP02"]) == {"TP02": table_totals(db_path)["TP02"]}
+    assert db.getRollupWatermark()[0] == upper_id
+
+
+def test_failed_update_keeps_the_watermark(db_path, monkeypatch, caplog):
+    db = open_result_db(db_path, ResultCache=False)
+    db.updateRollup()
+    last_id, _ = db.getRollupWatermark()
+    add_results(db_path, "TP01", 3)
+
+    def fail(*args):
+        raise RuntimeError("lock wait timeout")
+    monkeypatch.setattr(UltraTorkWebResultDb, "_foldRollup", fail)
+
+    assert db.updateRollup() == 0
+    assert "Updating the rollup failed" in caplog.text
+    assert db.getRollupWatermark()[0] == last_id
+
+
+def test_without_rollup_tables_counts_come_from_the_result_table(db_path, monkeypatch, caplog):
+    def fail(self, conn):
+        raise RuntimeError("CREATE command denied")
+    monkeypatch.setattr(UltraTorkWebResultDb, "_createRollup", fail)
+
+    db = open_result_db(db_path, ResultCache=False)
+    assert "the counts are read from the result table" in caplog.text
+    assert db.updateRollup() == 0
+
+    add_results(db_path, "TP03", 4)
+    assert daily_totals(db, ["TP03"]) == {"TP03": table_totals(db_path)["TP03"]}
+    assert db.getRollupWatermark()[0] == db.getLastResultId()
+    first, last = db.getRollupRange(["TP03"])
+    assert first is not None and last == "2024-07-31"
+
+
+def test_result_committed_late_under_a_lower_id_is_not_skipped(db_path, monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("UltraTorkWebResultDb.time.monotonic", lambda: now[0])
+    db = open_result_db(db_path, ResultCache=False, ResultSettleSeconds=5)
+    last_id = db.getLastResultId()
+    # Ids are only folded once they were seen settle seconds ago
+    assert db.updateRollup() == 0
+    now[0] = 1006.0
+    db.updateRollup()
+    assert db.getRollupWatermark()[0] == last_id
+
+    # One writer took the id last_id + 1, another one commits last_id + 2 first
+    add_results(db_path, "TP02", 1, first_id=last_id + 2)
+    now[0] = 1010.0
+    assert db.updateRollup() == 0
+    assert db.getResultCountsSince({"TP01": last_id, "TP02": last_id}) == ([], {"TP01": last_id, "TP02": last_id})
+
+    add_results(db_path, "TP01", 1, first_id=last_id + 1)
+    now[0] = 1016.0
+    rows, cursor = db.getResultCountsSince({"TP01": last_id, "TP02": last_id})
+    assert sorted((row[0], row[3]) for row in rows) == [("TP01", 1), ("TP02", 1)]
+    assert cursor == {"TP01": last_id + 2, "TP02": last_id + 2}
+    assert db.updateRollup() == 2
+    assert daily_totals(db, ["TP01", "TP02", "TP03"]) == table_totals(db_path)
+
+
+def test_queries_read_the_result_table_while_the_schema_is_set_up(db_path, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    create_index = UltraTorkWebResultDb._createIndex
+
+    def slow_index(self, conn):
+        started.set()
+        release.wait(10)
+        create_index(self, conn)
+    monkeypatch.setattr(UltraTorkWebResultDb, "_createIndex", slow_index)
+
+    db = UltraTorkWebResultDb()
+    db.setParameterList({"DBType": "SqlLite", "DBHost": db_path, "ResultCache": False})
+    setup = db.startSchemaSetup()
+    assert started.wait(10)
+    assert db.updateRollup() == 0
+    assert daily_totals(db, ["TP01"]) == {"TP01": table_totals(db_path)["TP01"]}
+
+    release.set()
+    setup.join(10)
+    assert not setup.is_alive() and db._RollupReady
+    assert db.updateRollup() == db.getLastResultId()
+    assert daily_totals(db, ["TP01"]) == {"TP01": table_totals(db_path)["TP01"]}